@@ -20,6 +20,7 @@
 from CGRdb import load_schema
 from neomodel import config
 from .graph import *
+from .network import *
 
 
 def load_db(neo4j, pg_schema, **kwargs):
@@ -27,4 +28,5 @@ def load_db(neo4j, pg_schema, **kwargs):
     config.DATABASE_URL = neo4j
 
 
-__all__ = ['load_db', 'Molecule', 'Reaction', 'Complex', 'EquilibriumState', 'TransitionState']
+__all__ = ['load_db', 'Molecule', 'Reaction', 'Complex', 'EquilibriumState', 'TransitionState',
+           'ReactionNetwork']
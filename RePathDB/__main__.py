@@ -22,19 +22,49 @@ from CGRdb import load_schema
 from neomodel import config
 from os.path import isdir, abspath
 from urllib.parse import urlparse
-from .populate import load_data
-from .wui import dash
+from .depiction import DepictionCache
+from .energy import check_energies
+from .geometry import migrate_geometry, rehash_signatures
+from .graph import EquilibriumState
+from .network import rebuild_components, update_summaries
+from .populate import load_data_bulk
+from .wui import dash, jobs, set_suffix
 
 
 def populate_core(args, db):
     if not isdir(args.files):
         print('files path not a directory')
     else:
-        load_data(args.files, args.suffix)
+        load_data_bulk(args.files, args.suffix, args.workers, args.batch_size, rmsd=args.rmsd)
+
+
+def index_core(args, db):
+    print(f'connected components: {rebuild_components(args.batch_size)}')
+    print(f'updated network summaries: {update_summaries()}')
+
+
+def migrate_core(args, db):
+    print(f'converted geometries: {migrate_geometry(args.batch_size)}')
+    print(f'rehashed signatures: {rehash_signatures(args.batch_size)}')
+    print(f'indexed ES geometries: {EquilibriumState.index_buckets(args.batch_size)}')
+
+
+def check_core(args, db):
+    report = check_energies(args.repair, args.batch_size)
+    print(('repaired' if args.repair else 'inconsistent') + ' energies: {complexes} complexes, {reactions} reactions, '
+          '{barriers} complex barriers, {es_ts_barriers} ES-TS barriers'.format_map(report))
+
+
+def depict_core(args, db):
+    print(f'rendered depictions: {DepictionCache(args.folder).prerender(args.batch_size)}')
 
 
 def web_core(args, db):
     ds = args.listening
+    set_suffix(args.suffix)
+    jobs.workers = args.workers
+    jobs.batch_size = args.batch_size
+    jobs.initializer = db.cgrdb_init_session  # upload jobs run outside of requests
 
     @dash.server.before_request
     def db_config():
@@ -52,12 +82,45 @@ subparsers = parser.add_subparsers(title='subcommands', description='available u
 populate = subparsers.add_parser('populate', help='load data into DB', formatter_class=ArgumentDefaultsHelpFormatter)
 populate.add_argument('--files', '-f', type=abspath, required=True, help='the directory with log files', default='.')
 populate.add_argument('--suffix', '-s', type=str, help='the log-file extension', default='.log')
+populate.add_argument('--workers', '-w', type=int, help='number of parsing processes', default=1)
+populate.add_argument('--batch-size', '-b', type=int, help='number of files written in one transaction', default=100)
+populate.add_argument('--rmsd', '-r', type=float,
+                      help='merge ES and TS with RMSD below threshold in angstroms. disabled by default')
 populate.set_defaults(func=populate_core)
 
+index = subparsers.add_parser('index', help='rebuild reachability index and network summaries',
+                              formatter_class=ArgumentDefaultsHelpFormatter)
+index.add_argument('--batch-size', '-b', type=int, help='number of complexes updated in one transaction',
+                   default=10000)
+index.set_defaults(func=index_core)
+
+migrate = subparsers.add_parser('migrate', help='convert geometries and signatures of ES and TS into new format '
+                                'and index ES for near-duplicates search',
+                                formatter_class=ArgumentDefaultsHelpFormatter)
+migrate.add_argument('--batch-size', '-b', type=int, help='number of nodes converted in one transaction',
+                     default=1000)
+migrate.set_defaults(func=migrate_core)
+
+check = subparsers.add_parser('check', help='check energies of complexes and reactions and stored barriers',
+                              formatter_class=ArgumentDefaultsHelpFormatter)
+check.add_argument('--repair', action='store_true', help='recompute inconsistent energies and barriers')
+check.add_argument('--batch-size', '-b', type=int, help='number of values fixed in one transaction', default=10000)
+check.set_defaults(func=check_core)
+
+depict = subparsers.add_parser('depict', help='render missing depictions of nodes for WEB UI',
+                               formatter_class=ArgumentDefaultsHelpFormatter)
+depict.add_argument('--folder', '-f', type=abspath, help='depictions directory. REPATHDB_DEPICTIONS by default')
+depict.add_argument('--batch-size', '-b', type=int, help='number of nodes loaded in one query', default=1000)
+depict.set_defaults(func=depict_core)
+
 web = subparsers.add_parser('wui', help='run WEB UI', formatter_class=ArgumentDefaultsHelpFormatter)
 web.add_argument('--listening', '-ls', type=urlparse,
                  help='listening host and port [//host:port]', default='//localhost:5000')
 web.add_argument('--debug', action='store_true')
+web.add_argument('--suffix', '-s', type=str, help='the log-file extension of uploaded files', default='.log')
+web.add_argument('--workers', '-w', type=int, help='number of parsing processes of upload', default=1)
+web.add_argument('--batch-size', '-b', type=int, help='number of uploaded files written in one transaction',
+                 default=100)
 web.set_defaults(func=web_core)
 
 parsed = parser.parse_args()
@@ -0,0 +1,485 @@
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2021 Ramil Nugmanov <nougmanoff@protonmail.com>
+#  Copyright 2021 Timur Gimadiev <timur.gimadiev@gmail.com>
+#  This file is part of RePathDB.
+#
+#  RePathDB is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, see <https://www.gnu.org/licenses/>.
+#
+"""
+Batched ingestion of reactions into graph.
+
+Expensive structure processing (parsing, CGR and signatures calculation) is done by `prepare` in worker processes.
+`BulkLoader` writes batches of prepared reactions into Neo4j by UNWIND queries in single transaction per batch.
+"""
+from CGRtools import MoleculeContainer, ReactionContainer
+from collections import defaultdict, namedtuple
+from json import dumps, loads
+from neomodel import db
+from numpy import frombuffer
+from typing import Dict, List, Optional, Tuple
+from .dedup import canonical_geometry, canonical_ranks, canonical_rmsd, geometry_bucket, near_buckets
+from .cache import ingestion_memo
+from .energy import energy_changed
+from .graph import Complex, Molecule, Reaction, brutto_formula, geometry_signature, structure_cache, viewer_payload
+from .geometry import pack_xyz, unpack_xyz, same_geometry
+from .network import merge_components_bulk, stale_summaries
+
+
+State = namedtuple('State', ['structure', 'signature', 'energy', 'viewer', 'bucket', 'canonical'])
+ReactionRecord = namedtuple('ReactionRecord', ['structure', 'signature', 'brutto', 'reactant', 'product', 'ts',
+                                               'reactant_complex', 'product_complex'])
+
+
+def prepare(structure: ReactionContainer) -> ReactionRecord:
+    """
+    Calculate all signatures of reaction required for database writing.
+
+    :param structure: ReactionContainer as accepted by Reaction
+    """
+    r = structure.reactants[0]
+    p = structure.products[0]
+    t = structure.reagents[0]
+    cgr = r ^ p
+    return ReactionRecord(structure, str(cgr), brutto_formula(t), _state(r, r), _state(p, p), _state(t, cgr),
+                          str(r), str(p))
+
+
+def _state(structure: MoleculeContainer, viewer) -> State:
+    canonical = canonical_geometry(structure)
+    return State(structure, geometry_signature(structure), structure.meta['energy'],
+                 viewer_payload(viewer, structure._conformers[0]), geometry_bucket(structure, canonical),
+                 canonical.tobytes())
+
+
+def _mapping(structure: MoleculeContainer, reference: MoleculeContainer) -> str:
+    if structure is reference:
+        return dumps({n: n for n in structure})
+    return dumps(next(structure.get_mapping(reference)))
+
+
+class BulkLoader:
+    """
+    Writer of prepared reactions batches.
+
+    Produces the same graph as sequential creation of Reaction objects.
+    """
+    def __init__(self, rmsd: Optional[float] = None, executor=None):
+        """
+        :param rmsd: RMSD threshold of near-duplicate ES and TS in angstroms. None disables tolerance-aware
+            deduplication
+        :param executor: concurrent.futures executor for parallel 2D cleaning of new molecules
+        """
+        self.rmsd = rmsd
+        self.executor = executor
+
+    def write(self, batch: List[Tuple[str, Optional[List[ReactionRecord]]]],
+              manifest: Optional[Dict[str, Tuple[int, float, str]]] = None) -> Dict[str, Tuple[str, List[int]]]:
+        """
+        Write batch of files in single transaction.
+
+        :param batch: pairs of file name and prepared reactions of file. None instead of reactions for invalid files.
+        :param manifest: file name to size, mtime and content hash map. If given, files with already loaded content
+            are skipped and manifest is updated in the same transaction.
+        :return: status and reactions ids of each file. Status is 'processed', 'duplicate' or 'invalid'.
+        """
+        try:
+            with db.transaction:
+                status = self._write(batch, manifest)
+                if manifest is not None:
+                    self.update_manifest(manifest, status)
+        except Exception:
+            memo = ingestion_memo()
+            if memo is not None:  # ids of rolled back nodes are invalid
+                memo.clear()
+            raise
+        return status
+
+    @staticmethod
+    def write_each(batch: List[Tuple[str, Optional[List[ReactionRecord]]]]) -> Dict[str, Tuple[str, List[int]]]:
+        """
+        Write files of batch one by one. Used after rollback of batch transaction.
+
+        :return: status and reactions ids of each file. Status is 'processed', 'invalid' or 'failed'.
+        """
+        status = {}
+        for name, records in batch:
+            if records is None:
+                status[name] = ('invalid', [])
+                continue
+            try:
+                status[name] = ('processed', [Reaction(r.structure).id for r in records])
+            except ValueError:
+                status[name] = ('invalid', [])
+            except Exception:  # e.g. database errors. file is retried on the next run
+                status[name] = ('failed', [])
+        return status
+
+    def _write(self, batch, manifest):
+        status = {name: ('processed', []) if rs is not None else ('invalid', []) for name, rs in batch}
+        if manifest is not None:
+            hashes = {}
+            rows, _ = db.cypher_query("UNWIND $rows AS row MATCH (f:LogFile {hash: row}) "
+                                      "WHERE f.status = 'processed' RETURN DISTINCT f.hash",
+                                      {'rows': list({manifest[name][2] for name, _ in batch})})
+            loaded = {x for x, in rows}
+            for name, rs in batch:
+                h = manifest[name][2]
+                if rs is not None and (h in loaded or hashes.setdefault(h, name) != name):
+                    status[name] = ('duplicate', [])
+        batch = [(name, rs) for name, rs in batch if status[name][0] == 'processed']
+        if not batch:
+            return status
+
+        # step 1: bruttos and states
+        near = set()
+        if self.rmsd is not None:
+            batch, near = self._deduplicate(batch, self.rmsd)
+        bruttos = self._merge_bruttos({r.brutto for _, rs in batch for r in rs})
+        es = self._merge_states('EquilibriumState', [s for _, rs in batch for r in rs for s in (r.reactant, r.product)],
+                                near)
+        ts = self._merge_states('TransitionState', [r.ts for _, rs in batch for r in rs], near)
+        for name, rs in batch:
+            for r in rs:
+                if any(not -.0001 < e[s.signature][1] - s.energy < .0001 for e, s in
+                       ((es, r.reactant), (es, r.product), (ts, r.ts))):
+                    status[name] = ('invalid', [])
+        batch = [(name, rs) for name, rs in batch if status[name][0] == 'processed']
+        records = [r for _, rs in batch for r in rs]
+        if not records:
+            return status
+
+        # step 2: complexes
+        complexes = self._merge_complexes(records, bruttos, es, self.executor)
+        # step 3: reactions
+        reactions = self._merge_reactions(records, bruttos, complexes, ts)
+        for name, rs in batch:
+            status[name][1].extend(reactions[r.signature] for r in rs)
+        stale_summaries({bruttos[r.brutto] for r in records})
+        # step 4: ES to TS barriers
+        rows = []
+        for r in records:
+            t_id, t_energy = ts[r.ts.signature]
+            for s in (r.reactant, r.product):
+                e_id, e_energy = es[s.signature]
+                rows.append([e_id, t_id, t_energy - e_energy])
+        db.cypher_query('UNWIND $rows AS row MATCH (e:EquilibriumState), (t:TransitionState) '
+                        'WHERE id(e) = row[0] AND id(t) = row[1] '
+                        'MERGE (e)-[x:E2T]->(t) ON CREATE SET x.energy = row[2]', {'rows': rows})
+        return status
+
+    @staticmethod
+    def update_manifest(manifest: Dict[str, Tuple[int, float, str]], status: Dict[str, Tuple[str, List[int]]]):
+        """
+        Store files status into manifest.
+
+        :param manifest: file name to size, mtime and content hash map
+        :param status: file name to status and reactions ids map
+        """
+        rows = [[name, *manifest[name], s, rs] for name, (s, rs) in status.items()]
+        db.cypher_query('UNWIND $rows AS row MERGE (f:LogFile {path: row[0]}) '
+                        'SET f.size = row[1], f.mtime = row[2], f.hash = row[3], f.status = row[4], '
+                        'f.reactions = row[5]', {'rows': rows})
+
+    @staticmethod
+    def manifest(files: List[str]) -> Dict[str, Tuple[int, float, str, str]]:
+        """
+        Load manifest of files.
+
+        :return: file name to size, mtime, content hash and status map
+        """
+        rows, _ = db.cypher_query('UNWIND $rows AS row MATCH (f:LogFile {path: row}) '
+                                  'RETURN f.path, f.size, f.mtime, f.hash, f.status', {'rows': files})
+        return {x[0]: tuple(x[1:]) for x in rows}
+
+    @staticmethod
+    def _merge_bruttos(bruttos) -> Dict[str, int]:
+        memo = ingestion_memo()
+        if memo is None:
+            memo = {}
+        else:
+            memo = memo.bruttos
+        known = {b: memo[b] for b in bruttos if b in memo}
+        if len(known) < len(bruttos):
+            rows, _ = db.cypher_query('UNWIND $rows AS row MERGE (b:Brutto {brutto: row}) RETURN row, id(b)',
+                                      {'rows': [b for b in bruttos if b not in known]})
+            memo.update(rows)
+            known.update(rows)
+        return known
+
+    @staticmethod
+    def _deduplicate(batch, rmsd):
+        """
+        Replace new ES and TS by stored or preceding in batch near-duplicates.
+
+        :return: batch and signatures of near-duplicates
+        """
+        states = {}
+        for _, rs in batch:
+            for r in rs:
+                for label, s in (('EquilibriumState', r.reactant), ('EquilibriumState', r.product),
+                                 ('TransitionState', r.ts)):
+                    states.setdefault((label, s.signature), s)
+
+        index = defaultdict(list)  # (label, bucket): [(signature, energy, canonical coordinates)]
+        new = []
+        for label in ('EquilibriumState', 'TransitionState'):
+            rows, _ = db.cypher_query(f'UNWIND $rows AS row MATCH (s:{label} {{signature: row}}) RETURN row',
+                                      {'rows': [x for l, x in states if l == label]})
+            existing = {x for x, in rows}
+            ss = [s for (l, x), s in states.items() if l == label and x not in existing]
+            buckets = {b for s in ss for b in near_buckets(s.structure, _canonical(s.canonical), rmsd)}
+            rows, _ = db.cypher_query(f'UNWIND $rows AS row MATCH (s:{label} {{bucket: row}}) '
+                                      'RETURN row, s.signature, s.energy, s.canonical_bin', {'rows': list(buckets)})
+            for b, x, e, c in rows:
+                index[(label, b)].append((x, e, _canonical(c)))
+            new.extend((label, s) for s in ss)
+
+        replace = {}
+        near = set()
+        for label, s in new:
+            coords = _canonical(s.canonical)
+            ranks = canonical_ranks(s.structure)
+            best = None
+            threshold = rmsd
+            for b in near_buckets(s.structure, coords, rmsd):
+                for x, e, c in index[(label, b)]:
+                    d = canonical_rmsd(ranks, coords, c)
+                    if d <= threshold:
+                        best = (x, e)
+                        threshold = d
+            if best is None:  # new representative
+                index[(label, s.bucket)].append((s.signature, s.energy, coords))
+            else:
+                replace[(label, s.signature)] = s._replace(signature=best[0], energy=best[1])
+                near.add(best[0])
+        if not replace:
+            return batch, near
+
+        def representative(s, label='EquilibriumState'):
+            return replace.get((label, s.signature), s)
+        return [(name, [r._replace(reactant=representative(r.reactant), product=representative(r.product),
+                                   ts=representative(r.ts, 'TransitionState')) for r in rs])
+                for name, rs in batch], near
+
+    @staticmethod
+    def _merge_states(label, states: List[State], near=()) -> Dict[str, Tuple[int, float]]:
+        """
+        Create new ES or TS nodes.
+
+        :param near: signatures of near-duplicates. geometry of near-duplicates is not checked
+        :return: signature to node id and stored energy map
+        """
+        rows = {}
+        for s in states:  # first state of signature is representative
+            if s.signature not in rows:
+                rows[s.signature] = [s.signature, s.energy,
+                                     *(bytearray(x) for x in pack_xyz(s.structure._conformers[0])),
+                                     s.bucket, bytearray(s.canonical)]
+        rows, _ = db.cypher_query(f'UNWIND $rows AS row MERGE (s:{label} {{signature: row[0]}}) '
+                                  'ON CREATE SET s.energy = row[1], s.atoms_bin = row[2], s.xyz_bin = row[3], '
+                                  's.bucket = row[4], s.canonical_bin = row[5] '
+                                  'RETURN row[0], id(s), s.energy, s.atoms_bin, s.xyz_bin, s.xyz_json',
+                                  {'rows': list(rows.values())})
+        stored = {}
+        for k, _, _, atoms, xyz, xyz_json in rows:
+            if atoms is not None:
+                stored[k] = dict(zip(*(x.tolist() for x in unpack_xyz(atoms, xyz))))
+            else:
+                stored[k] = loads(xyz_json)
+        for s in states:
+            if s.signature not in near and not same_geometry(stored[s.signature], s.structure._conformers[0]):
+                # rare. sequential loading stores full geometry key as signature
+                raise ValueError(f'{label} signature collision')
+        return {s: (i, e) for s, i, e, *_ in rows}
+
+    @staticmethod
+    def _merge_complexes(records, bruttos, es, executor=None) -> Dict[str, list]:
+        """
+        Create new complexes, update energies of existing and connect ES.
+
+        :return: complex signature to node id, energy and structure in complex atoms numbering.
+            structure of existing complexes is loaded on demand
+        """
+        states = defaultdict(dict)  # complex signature: ES signature: (ES, brutto)
+        for r in records:
+            states[r.reactant_complex][r.reactant.signature] = (r.reactant, r.brutto)
+            states[r.product_complex][r.product.signature] = (r.product, r.brutto)
+
+        rows, _ = db.cypher_query('UNWIND $rows AS row MATCH (c:Complex {signature: row}) RETURN row, id(c), c.energy',
+                                  {'rows': list(states)})
+        existing = {s: (i, e) for s, i, e in rows}
+        complexes = {}
+
+        new = []
+        fragments = []
+        for signature, ss in states.items():
+            if signature in existing:
+                continue
+            s, b = min(ss.values(), key=lambda x: x[0].energy)
+            fs = s.structure.split()
+            fragments.extend(fs)
+            new.append({'signature': signature, 'energy': s.energy, 'brutto': bruttos[b],
+                        'es': es[s.signature][0], 'mapping': _mapping(s.structure, s.structure),
+                        'viewer': s.viewer, 'molecules': fs})
+            complexes[signature] = [None, s.energy, s.structure]
+        molecules = iter(Molecule.resolve(fragments, executor))
+        for row in new:
+            row['molecules'] = [[m.id, dumps(next(ms.get_mapping(x)))]
+                                for x, (m, ms) in zip(row['molecules'], molecules)]
+        if new:
+            rows, _ = db.cypher_query('UNWIND $rows AS row '
+                                      'MATCH (b:Brutto), (e:EquilibriumState) '
+                                      'WHERE id(b) = row.brutto AND id(e) = row.es '
+                                      'CREATE (b)-[:B2C]->(c:Complex {signature: row.signature, energy: row.energy}) '
+                                      'SET c.component = id(c) '
+                                      'CREATE (e)-[:E2C {mapping_json: row.mapping, viewer_json: row.viewer}]->(c) '
+                                      'WITH row, c UNWIND row.molecules AS m '
+                                      'MATCH (x:Molecule) WHERE id(x) = m[0] '
+                                      'CREATE (x)-[:M2C {mapping_json: m[1]}]->(c) '
+                                      'RETURN DISTINCT row.signature, id(c)', {'rows': new})
+            for signature, i in rows:
+                complexes[signature][0] = i
+                structure_cache.invalidate(i)  # id of deleted node can be reused
+
+        energies = []
+        for signature, (i, e) in existing.items():
+            energy = min(s.energy for s, _ in states[signature].values())
+            if energy < e:  # new lowest ES found
+                energies.append([i, energy])
+                e = energy
+            complexes[signature] = [i, e, None]
+        if energies:
+            db.cypher_query('UNWIND $rows AS row MATCH (c:Complex) WHERE id(c) = row[0] SET c.energy = row[1]',
+                            {'rows': energies})
+            energy_changed(complexes=[i for i, _ in energies])  # barriers of existing reactions are outdated
+
+        # connect other ES
+        pairs = [[es[x][0], complexes[c][0]] for c, ss in states.items() for x in ss]
+        rows, _ = db.cypher_query('UNWIND $rows AS row MATCH (e:EquilibriumState)-[:E2C]->(c:Complex) '
+                                  'WHERE id(e) = row[0] AND id(c) = row[1] RETURN id(e), id(c)', {'rows': pairs})
+        connected = {tuple(x) for x in rows}
+        rows = []
+        for signature, ss in states.items():
+            complex_ = complexes[signature]
+            for x, (s, _) in ss.items():
+                pair = (es[x][0], complex_[0])
+                if pair not in connected:
+                    connected.add(pair)
+                    rows.append([*pair, _mapping(s.structure, _reference(complex_)), s.viewer])
+        if rows:
+            db.cypher_query('UNWIND $rows AS row MATCH (e:EquilibriumState), (c:Complex) '
+                            'WHERE id(e) = row[0] AND id(c) = row[1] '
+                            'CREATE (e)-[:E2C {mapping_json: row[2], viewer_json: row[3]}]->(c)', {'rows': rows})
+        memo = ingestion_memo()
+        if memo is not None:
+            memo.complexes.update((s, c[0]) for s, c in complexes.items())
+        return complexes
+
+    @staticmethod
+    def _merge_reactions(records, bruttos, complexes, ts):
+        """
+        Create new reactions, update energies of existing and connect TS.
+
+        :return: reaction signature to node id map
+        """
+        groups = defaultdict(list)
+        for r in records:
+            groups[r.signature].append(r)
+
+        rows, _ = db.cypher_query('UNWIND $rows AS row MATCH (r:Reaction {signature: row}) '
+                                  'RETURN row, id(r), r.energy', {'rows': list(groups)})
+        existing = {s: (i, e) for s, i, e in rows}
+        reactions = {}
+
+        new = []
+        for signature, rs in groups.items():
+            if signature in existing:
+                continue
+            r = min(rs, key=lambda x: x.ts.energy)
+            rc = complexes[r.reactant_complex]
+            pc = complexes[r.product_complex]
+            te = r.ts.energy
+            new.append({'signature': signature, 'energy': te, 'brutto': bruttos[r.brutto], 'ts': ts[r.ts.signature][0],
+                        'reactant': rc[0], 'product': pc[0],
+                        'reactant_mapping': _mapping(_reference(rc), r.reactant.structure),
+                        'product_mapping': _mapping(_reference(pc), r.product.structure),
+                        'reactant_barrier': te - rc[1], 'product_barrier': te - pc[1],
+                        'ts_mapping': _mapping(r.ts.structure, r.ts.structure), 'ts_viewer': r.ts.viewer})
+            reactions[signature] = [None, te, r.reactant.structure ^ r.product.structure]
+        if new:
+            rows, _ = db.cypher_query('UNWIND $rows AS row '
+                                      'MATCH (b:Brutto), (t:TransitionState), (c:Complex), (p:Complex) '
+                                      'WHERE id(b) = row.brutto AND id(t) = row.ts AND '
+                                      'id(c) = row.reactant AND id(p) = row.product '
+                                      'CREATE (b)-[:B2R]->(r:Reaction {signature: row.signature, energy: row.energy}) '
+                                      'CREATE (c)-[:C2R {mapping_json: row.reactant_mapping, '
+                                      'energy: row.reactant_barrier}]->(r) '
+                                      'CREATE (p)-[:R2C {mapping_json: row.product_mapping, '
+                                      'energy: row.product_barrier}]->(r) '
+                                      'CREATE (t)-[:T2R {mapping_json: row.ts_mapping, '
+                                      'viewer_json: row.ts_viewer}]->(r) '
+                                      'RETURN row.signature, id(r)', {'rows': new})
+            for signature, i in rows:
+                reactions[signature][0] = i
+                structure_cache.invalidate(i)
+            merge_components_bulk((row['reactant'], row['product']) for row in new)
+
+        energies = []
+        for signature, (i, e) in existing.items():
+            energy = min(r.ts.energy for r in groups[signature])
+            if energy < e:  # lower TS found. update barriers.
+                energies.append([i, energy])
+                e = energy
+            reactions[signature] = [i, e, None]
+        if energies:
+            db.cypher_query('UNWIND $rows AS row MATCH (r:Reaction) WHERE id(r) = row[0] SET r.energy = row[1]',
+                            {'rows': energies})
+            energy_changed(reactions=[i for i, _ in energies])
+
+        # connect other TS
+        pairs = [[ts[r.ts.signature][0], reactions[s][0]] for s, rs in groups.items() for r in rs]
+        rows, _ = db.cypher_query('UNWIND $rows AS row MATCH (t:TransitionState)-[:T2R]->(r:Reaction) '
+                                  'WHERE id(t) = row[0] AND id(r) = row[1] RETURN id(t), id(r)', {'rows': pairs})
+        connected = {tuple(x) for x in rows}
+        rows = []
+        for signature, rs in groups.items():
+            reaction = reactions[signature]
+            for r in rs:
+                pair = (ts[r.ts.signature][0], reaction[0])
+                if pair not in connected:
+                    connected.add(pair)
+                    cgr = r.reactant.structure ^ r.product.structure
+                    rows.append([*pair, _mapping(cgr, _reference(reaction, Reaction)), r.ts.viewer])
+        if rows:
+            db.cypher_query('UNWIND $rows AS row MATCH (t:TransitionState), (r:Reaction) '
+                            'WHERE id(t) = row[0] AND id(r) = row[1] '
+                            'CREATE (t)-[:T2R {mapping_json: row[2], viewer_json: row[3]}]->(r)', {'rows': rows})
+        return {s: i for s, (i, *_) in reactions.items()}
+
+
+def _canonical(data: bytes):
+    return frombuffer(data, dtype='<f8').reshape(-1, 3)
+
+
+def _reference(node: list, cls=Complex):
+    """
+    Structure of node in numbering of database. Loaded from database for existing nodes.
+    """
+    if node[2] is None:
+        node[2] = cls(id=node[0]).structure
+    return node[2]
+
+
+__all__ = ['BulkLoader', 'prepare']
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2021 Ramil Nugmanov <nougmanoff@protonmail.com>
+#  Copyright 2021 Timur Gimadiev <timur.gimadiev@gmail.com>
+#  This file is part of RePathDB.
+#
+#  RePathDB is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, see <https://www.gnu.org/licenses/>.
+#
+from collections import OrderedDict
+from contextlib import contextmanager
+from threading import Lock
+from typing import Optional
+
+
+class LRUCache:
+    """
+    Thread-safe bounded cache with least recently used eviction and hit/miss counters.
+    """
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    @property
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._data), 'maxsize': self.maxsize}
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+
+class IngestionMemo:
+    """
+    Per-ingestion-session memo of already resolved nodes.
+
+    Memo should be cleared on rollback of transaction, since ids of rolled back nodes are invalid.
+    Ids of complexes and reactions with changed energy are kept on clearing. Recomputation of barriers of
+    not existing nodes does nothing.
+    """
+    def __init__(self):
+        self.bruttos = {}  # formula: Brutto id
+        self.complexes = {}  # signature: Complex id
+        self.molecules = {}  # signature: Molecule id, CGRdb id
+        self.changed_complexes = set()  # ids of complexes with lowered energy. see energy_changed
+        self.changed_reactions = set()
+
+    def clear(self):
+        self.bruttos.clear()
+        self.complexes.clear()
+        self.molecules.clear()
+
+
+_memo = None
+
+
+def ingestion_memo() -> Optional[IngestionMemo]:
+    """
+    Memo of current ingestion session or None outside of session.
+    """
+    return _memo
+
+
+@contextmanager
+def ingestion_session():
+    """
+    Enable memo of resolved nodes for repeated encounters of the same Brutto, Complex and Molecule in loaded files.
+    """
+    global _memo
+    _memo = IngestionMemo()
+    try:
+        yield _memo
+    finally:
+        _memo = None
+
+
+__all__ = ['LRUCache', 'ingestion_session']
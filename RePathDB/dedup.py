@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2021 Ramil Nugmanov <nougmanoff@protonmail.com>
+#  Copyright 2021 Timur Gimadiev <timur.gimadiev@gmail.com>
+#  This file is part of RePathDB.
+#
+#  RePathDB is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, see <https://www.gnu.org/licenses/>.
+#
+"""
+Tolerance-aware deduplication of ES and TS geometries.
+
+Geometry is translated to centroid and rotated to principal axes with signs of axes fixed by third moments.
+Bucket of geometry is the hash of structure and grid cell of radii of gyration along principal axes. Near-duplicates
+are searched in neighbor buckets and compared by RMSD after optimal superposition. Symmetric atoms with equal
+canonical ranks are matched to the nearest atoms.
+"""
+from CGRtools import MoleculeContainer
+from hashlib import sha256
+from itertools import product
+from math import ceil, floor, inf, sqrt
+from neomodel import db
+from numpy import arange, array, diag, flatnonzero, diff, frombuffer, ndarray, sign, split, where
+from numpy.linalg import det, eigh, svd
+from typing import Dict, List, Optional
+
+
+cell = .1  # bucket grid step of radii of gyration in angstroms
+flips = array([[1, 1, 1], [1, -1, -1], [-1, 1, -1], [-1, -1, 1]], dtype=float)  # proper axes sign changes
+
+
+class Config:
+    rmsd = None  # RMSD threshold of near-duplicates in angstroms. None disables tolerance-aware deduplication
+
+
+config = Config()
+
+
+def canonical_ranks(structure: MoleculeContainer) -> ndarray:
+    return array(sorted(structure.atoms_order.values()))
+
+
+def canonical_geometry(structure: MoleculeContainer) -> ndarray:
+    """
+    Coordinates of atoms in canonical order and canonical orientation.
+    """
+    xyz = structure._conformers[0]
+    atoms_order = structure.atoms_order
+    coords = array([xyz[n] for n in sorted(structure, key=atoms_order.__getitem__)], dtype=float)
+    coords -= coords.mean(axis=0)
+    _, axes = eigh(coords.T @ coords)
+    coords = coords @ axes
+    skew = (coords ** 3).sum(axis=0)
+    signs = where(skew < 0, -1., 1.)
+    if signs.prod() * det(axes) < 0:  # keep proper rotation. reflection would merge enantiomers
+        signs[abs(skew).argmin()] *= -1
+    return coords * signs
+
+
+def _radii(coords: ndarray):
+    return (coords ** 2).mean(axis=0) ** .5
+
+
+def geometry_bucket(structure: MoleculeContainer, coords: ndarray) -> str:
+    """
+    Bucket of geometry in canonical orientation.
+    """
+    chem = sha256(str(structure).encode()).hexdigest()[:16]
+    return ':'.join([chem, *(str(floor(r / cell)) for r in _radii(coords))])
+
+
+def near_buckets(structure: MoleculeContainer, coords: ndarray, rmsd: float) -> List[str]:
+    """
+    Buckets possibly containing geometries within given RMSD.
+    """
+    chem = sha256(str(structure).encode()).hexdigest()[:16]
+    cells = [floor(r / cell) for r in _radii(coords)]
+    n = ceil(rmsd / cell)
+    return [':'.join([chem, *(str(c + o) for c, o in zip(cells, offset))])
+            for offset in product(range(-n, n + 1), repeat=3)]
+
+
+def canonical_rmsd(ranks: ndarray, coords: ndarray, other: ndarray) -> float:
+    """
+    RMSD of geometries in canonical order and orientation.
+    """
+    if coords.shape != other.shape:
+        return inf
+    groups = [g for g in split(arange(len(ranks)), flatnonzero(diff(ranks)) + 1) if len(g) > 1]
+    best = inf
+    for f in flips:
+        x = coords * f
+        y = x.copy()
+        for g in groups:  # greedy matching of symmetric atoms
+            d = ((x[g, None] - other[None, g]) ** 2).sum(axis=-1)
+            free = set(range(len(g)))
+            for i in d.min(axis=1).argsort():
+                j = min(free, key=d[i].__getitem__)
+                free.discard(j)
+                y[g[j]] = x[g[i]]
+        # Kabsch superposition
+        u, _, vt = svd(y.T @ other)
+        r = vt.T @ diag([1., 1., sign(det(vt.T @ u.T)) or 1.]) @ u.T
+        rmsd = sqrt(((y @ r.T - other) ** 2).sum(axis=1).mean())
+        if rmsd < best:
+            best = rmsd
+    return best
+
+
+def near_state(label: str, structure: MoleculeContainer, coords: ndarray, signature: str,
+               rmsd: float) -> Optional[int]:
+    """
+    Find stored ES or TS within RMSD threshold.
+
+    :param signature: signature of geometry. None is returned if exactly the same geometry exists.
+    :return: id of the nearest node
+    """
+    rows, _ = db.cypher_query(f'UNWIND $buckets AS b MATCH (s:{label} {{bucket: b}}) '
+                              'RETURN id(s), s.signature, s.canonical_bin',
+                              {'buckets': near_buckets(structure, coords, rmsd)})
+    ranks = canonical_ranks(structure)
+    best = None
+    for i, s, c in rows:
+        if s == signature:
+            return
+        d = canonical_rmsd(ranks, coords, frombuffer(c, dtype='<f8').reshape(-1, 3))
+        if d <= rmsd:
+            rmsd = d
+            best = i
+    return best
+
+
+def unindexed_states() -> Dict[str, int]:
+    """
+    Number of ES and TS without bucket. Such nodes populated by older versions are invisible for near-duplicates search.
+    """
+    return {label: db.cypher_query(f'MATCH (s:{label}) WHERE s.bucket IS NULL RETURN count(s)')[0][0][0]
+            for label in ('EquilibriumState', 'TransitionState')}
+
+
+__all__ = ['config']
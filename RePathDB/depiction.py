@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2021 Ramil Nugmanov <nougmanoff@protonmail.com>
+#  Copyright 2021 Timur Gimadiev <timur.gimadiev@gmail.com>
+#  This file is part of RePathDB.
+#
+#  RePathDB is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, see <https://www.gnu.org/licenses/>.
+#
+"""
+Disk cache of 2D depictions of Molecule, Complex and Reaction nodes.
+
+Files are named by node type, id and digest of node signature. Digest protects from stale pictures of
+reused ids of deleted nodes and makes URLs of depictions immutable.
+"""
+from hashlib import sha1
+from neomodel import db
+from os import getenv, replace, getpid
+from pathlib import Path
+from pony.orm import db_session
+from threading import get_ident
+from typing import Optional
+from .graph import Molecule, Complex, Reaction
+
+
+kinds = {'molecule': Molecule, 'complex': Complex, 'reaction': Reaction}
+
+
+def digest(node) -> str:
+    """
+    Short digest of node signature. Molecules are identified by CGRdb id.
+    """
+    signature = str(node.cgrdb) if isinstance(node, Molecule) else node.signature
+    return sha1(signature.encode()).hexdigest()[:16]
+
+
+class DepictionCache:
+    def __init__(self, folder=None):
+        """
+        :param folder: directory of SVG files. By default taken from REPATHDB_DEPICTIONS environment variable.
+        """
+        self.folder = Path(folder or getenv('REPATHDB_DEPICTIONS', '/tmp/repathdb_depictions'))
+
+    def path(self, kind: str, _id: int, signature: str) -> Path:
+        return self.folder / f'{kind}-{_id}-{signature}.svg'
+
+    @staticmethod
+    def url(node) -> str:
+        """
+        URL of depiction served by WUI.
+        """
+        return f'/depiction/{type(node).__name__.lower()}/{node.id}/{digest(node)}.svg'
+
+    def load(self, kind: str, _id: int, signature: str) -> Optional[str]:
+        """
+        Get depiction by URL parts. Missing depiction is rendered if node exists and signature is actual.
+        """
+        file = self.path(kind, _id, signature)
+        if file.exists():
+            return file.read_text()
+        node = kinds[kind].get(_id)
+        if node is None or digest(node) != signature:
+            return
+        return self._render(node, file)
+
+    def svg(self, node) -> str:
+        file = self.path(type(node).__name__.lower(), node.id, digest(node))
+        if file.exists():
+            return file.read_text()
+        return self._render(node, file)
+
+    @db_session
+    def _render(self, node, file: Path) -> str:
+        svg = node.depict()
+        self.folder.mkdir(parents=True, exist_ok=True)
+        tmp = file.with_suffix(f'.{getpid()}.{get_ident()}.tmp')
+        tmp.write_text(svg)
+        replace(str(tmp), str(file))  # atomic for concurrent requests
+        return svg
+
+    def prerender(self, batch_size: int = 1000) -> int:
+        """
+        Render depictions of all nodes missing in cache.
+
+        :return: number of rendered depictions
+        """
+        rendered = 0
+        for kind, cls in kinds.items():
+            skip = 0
+            while True:
+                rows, _ = db.cypher_query(f'MATCH (n:{cls.__name__}) RETURN n ORDER BY id(n) SKIP $skip LIMIT $limit',
+                                          {'skip': skip, 'limit': batch_size})
+                if not rows:
+                    break
+                skip += batch_size
+                for n, in rows:
+                    node = cls.inflate(n)
+                    file = self.path(kind, node.id, digest(node))
+                    if not file.exists():
+                        self._render(node, file)
+                        rendered += 1
+        return rendered
+
+
+__all__ = ['DepictionCache']
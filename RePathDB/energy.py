@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2021 Ramil Nugmanov <nougmanoff@protonmail.com>
+#  Copyright 2021 Timur Gimadiev <timur.gimadiev@gmail.com>
+#  This file is part of RePathDB.
+#
+#  RePathDB is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, see <https://www.gnu.org/licenses/>.
+#
+"""
+Consistency of stored energies.
+
+Energy of Complex is the lowest energy of its ES, energy of Reaction is the lowest energy of its TS.
+Barriers stored on C2R and R2C relationships are differences of Reaction and Complex energies and used by path search
+as-is. Barriers stored on E2T relationships are differences of TS and ES energies.
+
+Energies of existing complexes and reactions are lowered on loading of new ES and TS. Such complexes and reactions are
+recorded during ingestion session and their barriers are recomputed by single batched pass at the end of loading.
+"""
+from neomodel import db
+from typing import Dict, Iterable
+from .cache import ingestion_memo
+
+
+tolerance = 1e-8  # hartree
+
+checks = {
+    # name: (query of inconsistent items returning ids of nodes, query of repair by ids)
+    # values computed from missing energies are skipped, since repair can't fix them
+    'complexes': ('MATCH (e:EquilibriumState)-[:E2C]->(c:Complex) WITH c, min(e.energy) AS m '
+                  'WHERE m IS NOT NULL AND (c.energy IS NULL OR abs(c.energy - m) > $tolerance) RETURN id(c)',
+                  'UNWIND $rows AS row MATCH (e:EquilibriumState)-[:E2C]->(c:Complex) WHERE id(c) = row '
+                  'WITH c, min(e.energy) AS m SET c.energy = m '
+                  'WITH c MATCH (b:Brutto)-[:B2C]->(c) REMOVE b.network_json'),
+    'reactions': ('MATCH (t:TransitionState)-[:T2R]->(r:Reaction) WITH r, min(t.energy) AS m '
+                  'WHERE m IS NOT NULL AND (r.energy IS NULL OR abs(r.energy - m) > $tolerance) RETURN id(r)',
+                  'UNWIND $rows AS row MATCH (t:TransitionState)-[:T2R]->(r:Reaction) WHERE id(r) = row '
+                  'WITH r, min(t.energy) AS m SET r.energy = m '
+                  'WITH r MATCH (b:Brutto)-[:B2R]->(r) REMOVE b.network_json'),
+    'barriers': ('MATCH (c:Complex)-[x:C2R|R2C]->(r:Reaction) WHERE r.energy IS NOT NULL AND c.energy IS NOT NULL '
+                 'AND (x.energy IS NULL OR abs(x.energy - r.energy + c.energy) > $tolerance) RETURN [id(c), id(r)]',
+                 'UNWIND $rows AS row MATCH (c:Complex)-[x:C2R|R2C]->(r:Reaction) '
+                 'WHERE id(c) = row[0] AND id(r) = row[1] SET x.energy = r.energy - c.energy'),
+    'es_ts_barriers': ('MATCH (e:EquilibriumState)-[x:E2T]->(t:TransitionState) '
+                       'WHERE t.energy IS NOT NULL AND e.energy IS NOT NULL '
+                       'AND (x.energy IS NULL OR abs(x.energy - t.energy + e.energy) > $tolerance) '
+                       'RETURN [id(e), id(t)]',
+                       'UNWIND $rows AS row MATCH (e:EquilibriumState)-[x:E2T]->(t:TransitionState) '
+                       'WHERE id(e) = row[0] AND id(t) = row[1] SET x.energy = t.energy - e.energy')
+}
+
+
+def check_energies(repair: bool = False, batch_size: int = 10000) -> Dict[str, int]:
+    """
+    Find energies of complexes and reactions and barriers inconsistent with energies of ES and TS.
+    Inconsistency is possible after loading of lower ES or TS of existing complex or reaction.
+    Values depending on missing energies are not reported.
+
+    :param repair: recompute inconsistent values. Network summaries of changed Bruttos are marked outdated
+    :param batch_size: number of values fixed in one transaction
+    :return: number of found inconsistent values of each kind
+    """
+    report = {}
+    for name, (find, fix) in checks.items():  # order matters. barriers depend on energies of nodes
+        if not repair:
+            rows, _ = db.cypher_query(f'{find[:find.rindex("RETURN")]}RETURN count(*)', {'tolerance': tolerance})
+            report[name] = rows[0][0]
+            continue
+        report[name] = 0
+        repaired = set()
+        while True:
+            rows, _ = db.cypher_query(f'{find} LIMIT $limit', {'tolerance': tolerance, 'limit': batch_size})
+            rows = [x for x, in rows if _key(x) not in repaired]
+            if not rows:  # values found again after repair can't be fixed. stop instead of endless loop
+                break
+            db.cypher_query(fix, {'rows': rows})
+            repaired.update(_key(x) for x in rows)
+            report[name] += len(rows)
+    return report
+
+
+def _key(row):
+    return tuple(row) if isinstance(row, list) else row
+
+
+def energy_changed(complexes: Iterable[int] = (), reactions: Iterable[int] = ()):
+    """
+    Record complexes and reactions which energy was lowered.
+
+    Barriers of their C2R and R2C relationships are recomputed by `recompute_changed` at the end of ingestion session.
+    Outside of ingestion session barriers are recomputed immediately.
+    """
+    memo = ingestion_memo()
+    if memo is None:
+        recompute_barriers(complexes, reactions)
+    else:
+        memo.changed_complexes.update(complexes)
+        memo.changed_reactions.update(reactions)
+
+
+def recompute_changed(batch_size: int = 10000) -> int:
+    """
+    Recompute barriers of complexes and reactions recorded in current ingestion session.
+
+    :return: number of updated relationships
+    """
+    memo = ingestion_memo()
+    if memo is None:
+        return 0
+    updated = recompute_barriers(memo.changed_complexes, memo.changed_reactions, batch_size)
+    memo.changed_complexes.clear()
+    memo.changed_reactions.clear()
+    return updated
+
+
+def recompute_barriers(complexes: Iterable[int] = (), reactions: Iterable[int] = (), batch_size: int = 10000) -> int:
+    """
+    Recompute barriers of all C2R and R2C relationships of given complexes and reactions in batches.
+
+    :return: number of updated relationships
+    """
+    updated = 0
+    for key, ids in (('c', list(complexes)), ('r', list(reactions))):
+        for i in range(0, len(ids), batch_size):
+            rows, _ = db.cypher_query(f'UNWIND $rows AS row MATCH (c:Complex)-[x:C2R|R2C]->(r:Reaction) '
+                                      f'WHERE id({key}) = row SET x.energy = r.energy - c.energy RETURN count(x)',
+                                      {'rows': ids[i:i + batch_size]})
+            updated += rows[0][0]
+    return updated
+
+
+__all__ = ['check_energies', 'recompute_barriers', 'recompute_changed']
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2021 Ramil Nugmanov <nougmanoff@protonmail.com>
+#  Copyright 2021 Timur Gimadiev <timur.gimadiev@gmail.com>
+#  This file is part of RePathDB.
+#
+#  RePathDB is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, see <https://www.gnu.org/licenses/>.
+#
+"""
+Binary storage of ES and TS geometries.
+
+Geometry is stored in two byte array properties: atom numbers as little-endian int32 and coordinates of atoms in the
+same order as little-endian float64 triples. NumPy arrays are created over stored bytes without copying.
+
+ES and TS are indexed by fixed-size hash of geometry key. Full geometry key is used as signature only for
+nodes which hash collides with hash of different geometry.
+"""
+from hashlib import sha256
+from json import loads
+from neomodel import db
+from neomodel.properties import Property, validator
+from numpy import array, frombuffer, ndarray
+from typing import Dict, Tuple
+
+
+class BytesProperty(Property):
+    """
+    Neo4j byte array property.
+    """
+    @validator
+    def inflate(self, value):
+        return bytes(value)
+
+    @validator
+    def deflate(self, value):
+        return bytearray(value)
+
+
+def pack_xyz(xyz: Dict[int, Tuple[float, float, float]]) -> Tuple[bytes, bytes]:
+    """
+    Pack coordinates of atoms into atom numbers and coordinates bytes.
+    """
+    atoms = sorted(xyz)
+    return array(atoms, dtype='<i4').tobytes(), array([xyz[n] for n in atoms], dtype='<f8').tobytes()
+
+
+def unpack_xyz(atoms: bytes, xyz: bytes) -> Tuple[ndarray, ndarray]:
+    """
+    Zero-copy view of packed geometry.
+
+    :return: atom numbers and (n, 3) coordinates arrays
+    """
+    return frombuffer(atoms, dtype='<i4'), frombuffer(xyz, dtype='<f8').reshape(-1, 3)
+
+
+def signature_hash(key: str) -> str:
+    """
+    Fixed-size signature of ES or TS from geometry key.
+    """
+    return sha256(key.encode()).hexdigest()
+
+
+def same_geometry(xyz: Dict[int, Tuple[float, float, float]], other: Dict[int, Tuple[float, float, float]]) -> bool:
+    """
+    Check geometries with the same signature for hash collision. Atoms numbering is ignored.
+    """
+    return len(xyz) == len(other) and \
+        sorted(tuple(round(x, 4) for x in v) for v in xyz.values()) == \
+        sorted(tuple(round(x, 4) for x in v) for v in other.values())
+
+
+def migrate_geometry(batch_size: int = 1000) -> int:
+    """
+    Convert xyz_json properties of ES and TS nodes populated by older versions into binary format.
+
+    :return: number of converted nodes
+    """
+    converted = 0
+    for label in ('EquilibriumState', 'TransitionState'):
+        while True:
+            rows, _ = db.cypher_query(f'MATCH (s:{label}) WHERE exists(s.xyz_json) '
+                                      'RETURN id(s), s.xyz_json LIMIT $limit', {'limit': batch_size})
+            if not rows:
+                break
+            rows = [[i, *(bytearray(x) for x in pack_xyz({int(k): v for k, v in loads(xyz).items()}))]
+                    for i, xyz in rows]
+            db.cypher_query(f'UNWIND $rows AS row MATCH (s:{label}) WHERE id(s) = row[0] '
+                            'SET s.atoms_bin = row[1], s.xyz_bin = row[2] REMOVE s.xyz_json', {'rows': rows})
+            converted += len(rows)
+    return converted
+
+
+def rehash_signatures(batch_size: int = 1000) -> int:
+    """
+    Replace full geometry keys of ES and TS populated by older versions with hash signatures.
+    Nodes which hash is already taken keep full key as signature.
+
+    :return: number of updated nodes
+    """
+    updated = 0
+    for label in ('EquilibriumState', 'TransitionState'):
+        last = -1
+        while True:
+            rows, _ = db.cypher_query(f'MATCH (s:{label}) WHERE id(s) > $last AND s.signature STARTS WITH "[" '
+                                      'RETURN id(s), s.signature ORDER BY id(s) LIMIT $limit',
+                                      {'last': last, 'limit': batch_size})
+            if not rows:
+                break
+            last = rows[-1][0]
+            hashes = {signature_hash(k): i for i, k in rows}
+            taken, _ = db.cypher_query(f'MATCH (s:{label}) WHERE s.signature IN $hashes RETURN s.signature',
+                                       {'hashes': list(hashes)})
+            for h, in taken:
+                del hashes[h]
+            db.cypher_query(f'UNWIND $rows AS row MATCH (s:{label}) WHERE id(s) = row[0] SET s.signature = row[1]',
+                            {'rows': [[i, h] for h, i in hashes.items()]})
+            updated += len(hashes)
+    return updated
+
+
+__all__ = ['migrate_geometry', 'rehash_signatures']
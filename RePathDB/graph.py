@@ -18,20 +18,186 @@
 #  along with this program; if not, see <https://www.gnu.org/licenses/>.
 #
 from CGRdb import Molecule as pMolecule
-from CGRtools import MoleculeContainer, ReactionContainer
+from CGRtools import MoleculeContainer, ReactionContainer, CGRContainer
 from CGRtools.algorithms.x3dom import JupyterWidget
 from collections import namedtuple, Counter
 from functools import reduce
+from json import dumps, loads
 from neomodel import (StructuredNode, StructuredRel, IntegerProperty, FloatProperty, JSONProperty, RelationshipTo,
-                      RelationshipFrom, One, NodeMeta, StringProperty, DoesNotExist, UniqueProperty)
+                      RelationshipFrom, One, NodeMeta, StringProperty, DoesNotExist, UniqueProperty, ArrayProperty, db)
 from operator import or_
 from pony.orm import db_session, flush
 from itertools import count
 from itertools import islice
 from heapq import heappush, heappop
+from typing import List, Tuple, Optional, Union
+from neo4j.exceptions import ClientError
+from numpy import ndarray
+from .cache import LRUCache, ingestion_memo
+from .dedup import config as dedup_config, canonical_geometry, geometry_bucket, near_state
+from .energy import energy_changed
+from .geometry import BytesProperty, pack_xyz, unpack_xyz, signature_hash, same_geometry
+from .network import (DatabaseNetwork, BatchNetwork, ReactionNetwork, server_paths, merge_components,
+                      molecules_connected, stale_summaries)
+from .search import k_shortest_paths, bottleneck_paths, bidirectional_paths, breadth_first_paths
 
 
 weighted_path = namedtuple('WeightedPath', ['nodes', 'cost', 'total_cost'])
+structure_cache = LRUCache(4096)  # assembled structures of Complex and Reaction nodes by node id
+
+
+def _invalidate_structures(*ids: int):
+    """
+    Drop cached structures of nodes and of reactions of complexes, since reaction structure contains complexes.
+    """
+    rows, _ = db.cypher_query('MATCH (c:Complex)-[:C2R|R2C]-(r:Reaction) WHERE id(c) IN $ids RETURN DISTINCT id(r)',
+                              {'ids': list(ids)})
+    for x in ids:
+        structure_cache.invalidate(x)
+    for x, in rows:
+        structure_cache.invalidate(x)
+
+
+def brutto_formula(structure: MoleculeContainer) -> str:
+    """
+    Empirical formula of structure used as Brutto unique key.
+    """
+    return ''.join(f'{a}{n}' for a, n in sorted(Counter(a.atomic_symbol for _, a in structure.atoms()).items()))
+
+
+def geometry_key(structure: MoleculeContainer) -> str:
+    """
+    Full geometry key of EquilibriumState or TransitionState: rounded coordinates of atoms in canonical order.
+    """
+    xyz = structure._conformers[0]
+    signature = [None] * len(structure)
+    for n, m in structure.atoms_order.items():
+        signature[m - 1] = [round(x, 4) for x in xyz[n]]
+    return str(signature)
+
+
+def geometry_signature(structure: MoleculeContainer) -> str:
+    """
+    Signature of EquilibriumState or TransitionState: hash of geometry key.
+    """
+    return signature_hash(geometry_key(structure))
+
+
+def _clean2d(structure: MoleculeContainer) -> MoleculeContainer:
+    structure.clean2d()
+    return structure
+
+
+def viewer_payload(structure: Union[MoleculeContainer, CGRContainer], xyz) -> str:
+    """
+    3D model of ES or TS for Mol3dDash viewer of WEB UI in JSON. Changed bonds of CGR are marked by orders change.
+
+    :param xyz: coordinates of atoms of structure
+    """
+    order = {n: i for i, n in enumerate(structure)}
+    atoms = [{'elem': a.atomic_symbol, 'x': round(xyz[n][0], 4), 'y': round(xyz[n][1], 4), 'z': round(xyz[n][2], 4)}
+             for n, a in structure.atoms()]
+    bonds = []
+    for n, m, b in structure.bonds():
+        bond = {'atom1': order[n], 'atom2': order[m]}
+        if not isinstance(structure, CGRContainer) or b.p_order == b.order:
+            bond['maxorder'] = b.order
+        elif b.order is None:
+            bond.update(maxorder=b.p_order, **{'from': 0})
+        elif b.p_order is None:
+            bond.update(maxorder=b.order, to=0)
+        elif b.order > b.p_order:
+            bond.update(maxorder=b.order, to=b.p_order)
+        else:
+            bond.update(maxorder=b.p_order, **{'from': b.order})
+        bonds.append(bond)
+    return dumps({'atoms': atoms, 'bonds': bonds}, separators=(',', ':'))
+
+
+def inflate_path(path):
+    """
+    Convert path of node ids found in ReactionNetwork snapshot into path of Complex and Reaction nodes.
+    """
+    nodes, _ = db.cypher_query('MATCH (n) WHERE id(n) IN $ids RETURN n', {'ids': list({x for x, _ in path})})
+    nodes = {n.id: n for n, in nodes}
+    return [((Reaction if i % 2 else Complex).inflate(nodes[x]), b) for i, (x, b) in enumerate(path)]
+
+
+class LazyNode:
+    """
+    Placeholder of Complex or Reaction node found by server-side search.
+    Node is loaded from database on first access to attributes other than id and energy.
+    """
+    __slots__ = ('id', 'energy', '_class', '_node')
+
+    def __init__(self, cls, _id, energy):
+        self.id = _id
+        self.energy = energy
+        self._class = cls
+        self._node = None
+
+    def __getattr__(self, item):
+        if self._node is None:
+            self._node = self._class[self.id]
+        return getattr(self._node, item)
+
+    def __eq__(self, other):
+        return self.id == other.id
+
+    def __hash__(self):
+        return self.id
+
+    def __str__(self):
+        return str(self.structure)
+
+
+def lazy_path(ids, energies, barriers):
+    """
+    Convert path of nodes ids, energies and relationships barriers into path of lazy Complex and Reaction nodes.
+    """
+    path = [(LazyNode(Complex, ids[0], energies[0]), 0)]
+    for i in range(1, len(ids), 2):
+        barrier = barriers[i - 1]  # stored on C2R relationship
+        path.append((LazyNode(Reaction, ids[i], energies[i]), barrier))
+        path.append((LazyNode(Complex, ids[i + 1], energies[i + 1]), barrier))
+    return path
+
+
+def search_server(sources, targets, max_len, limit=None):
+    """
+    Server-side search of paths. Returns None if query failed on the Neo4j side.
+    """
+    try:
+        paths = server_paths(sources, targets, max_len, limit)
+    except ClientError:  # e.g. transaction timeout on dense networks
+        return
+    return [lazy_path(*path) for path in paths]
+
+
+def ranked_paths(sources, targets, limit, max_path, network, rank):
+    """
+    Find best paths between complexes ids and inflate them into weighted paths.
+    """
+    if network is None:
+        network = DatabaseNetwork()
+    if rank == 'barrier':
+        paths = bottleneck_paths(network, sources, targets, max_path, limit)
+    elif rank == 'total':
+        paths = k_shortest_paths(network, sources, targets, max_path, limit)
+    else:
+        raise ValueError('invalid rank')
+    return [weight_path(inflate_path(path)) for _, path in paths]
+
+
+def weight_path(path):
+    nodes = []
+    costs = []
+    total = 0
+    for i, (node, barrier) in enumerate(path, start=1):
+        nodes.append(node)
+        costs.append(barrier) if i % 2 == 0 else costs.append(0)
+        total += costs[-1]
+    return weighted_path(nodes, costs, total)
 
 
 class ExtNodeMeta(NodeMeta):
@@ -66,11 +232,19 @@ class Mapping(StructuredRel):
     def mapping(self):
         return {int(k): v for k, v in self.mapping_json.items()}
 
+    def post_save(self):
+        # structures of Complex and Reaction nodes are assembled by mappings of relationships
+        _invalidate_structures(self._start_node_id, self._end_node_id)
+
 
 class M_and_B(Mapping, Barrier):
     pass
 
 
+class M_and_V(Mapping):
+    viewer_json = StringProperty()  # precalculated 3D model of ES or TS for WEB UI
+
+
 class Brutto(Mixin, StructuredNode, metaclass=ExtNodeMeta):
     """
     Node type for the Neo4j
@@ -78,6 +252,7 @@ class Brutto(Mixin, StructuredNode, metaclass=ExtNodeMeta):
     """
     brutto = StringProperty(unique_index=True, required=True)
     name = StringProperty()
+    network_json = StringProperty()  # precomputed overview of reaction network. see network_summary
 
     complexes = RelationshipTo('Complex', 'B2C')
     reactions = RelationshipTo('Reaction', 'B2R')
@@ -86,9 +261,14 @@ class Brutto(Mixin, StructuredNode, metaclass=ExtNodeMeta):
         if structure is not None:
             if kwargs:
                 raise ValueError('only structure argument allowed')
-            brutto = ''.join(f'{a}{n}' for a, n in
-                             sorted(Counter(a.atomic_symbol for _, a in structure.atoms()).items()))
-            super().__init__(id=self.get_or_create({'brutto': brutto}, lazy=True)[0].id, brutto=brutto)
+            brutto = brutto_formula(structure)
+            memo = ingestion_memo()
+            if memo is not None and brutto in memo.bruttos:
+                super().__init__(id=memo.bruttos[brutto], brutto=brutto)
+            else:
+                super().__init__(id=self.get_or_create({'brutto': brutto}, lazy=True)[0].id, brutto=brutto)
+                if memo is not None:
+                    memo.bruttos[brutto] = self.id
         else:
             super().__init__(**kwargs)
 
@@ -110,6 +290,13 @@ class Molecule(Mixin, StructuredNode, metaclass=ExtNodeMeta):
         if structure is not None:  # get or create Molecule from structure
             if kwargs:
                 raise ValueError('only structure argument allowed')
+            memo = ingestion_memo()
+            if memo is not None:
+                signature = str(structure)
+                if signature in memo.molecules:
+                    _id, cgrdb, _ = memo.molecules[signature]
+                    super().__init__(id=_id, cgrdb=cgrdb)
+                    return
             with db_session:
                 found = pMolecule.find_structure(structure)
                 if not found:
@@ -120,10 +307,103 @@ class Molecule(Mixin, StructuredNode, metaclass=ExtNodeMeta):
                     self.save()
                 else:  # load existing or fix broken links
                     super().__init__(id=self.get_or_create({'cgrdb': found.id}, lazy=True)[0].id, cgrdb=found.id)
+            if memo is not None:
+                memo.molecules[signature] = (self.id, self.cgrdb, None)
         else:
             super().__init__(**kwargs)
 
-    def search_path(self, target: 'Molecule', max_len=10):
+    @classmethod
+    def resolve(cls, structures: List[MoleculeContainer], executor=None) -> List[Tuple['Molecule', MoleculeContainer]]:
+        """
+        Get or create Molecules of many structures at once.
+
+        Structures are deduplicated and searched in CGRdb in single session. Missing molecules are cleaned in 2D out of
+        session and stored in CGRdb in single session. Molecule nodes are merged by single query.
+
+        2D cleaning stays on ingestion path: CGRdb stores structure with its 2D coordinates once, and stored
+        structures are never rewritten. Only new molecules are cleaned, and with executor it runs in parallel.
+
+        :param executor: concurrent.futures executor for parallel 2D cleaning of new molecules
+        :return: Molecule node and its structure in CGRdb for each of structures
+        """
+        memo = ingestion_memo()
+        keys = [str(s) for s in structures]
+        unique = {}
+        for k, s in zip(keys, structures):
+            unique.setdefault(k, s)
+
+        found = {}  # signature: CGRdb id, CGRdb structure
+        resolved = {}  # signature: Molecule node id
+        with db_session:
+            for k, s in unique.items():
+                if memo is not None and k in memo.molecules:
+                    _id, cgrdb, ms = memo.molecules[k]
+                    found[k] = (cgrdb, pMolecule[cgrdb].structure if ms is None else ms)
+                    resolved[k] = _id
+                    continue
+                m = pMolecule.find_structure(s)
+                if m:
+                    found[k] = (m.id, m.structure)
+
+        new = [(k, s) for k, s in unique.items() if k not in found]
+        if new:
+            if executor is None:
+                cleaned = [_clean2d(s) for _, s in new]
+            else:
+                cleaned = list(executor.map(_clean2d, [s for _, s in new]))
+            with db_session:
+                ms = [(k, pMolecule(s), s) for (k, _), s in zip(new, cleaned)]
+                flush()
+                for k, m, s in ms:
+                    found[k] = (m.id, s)
+
+        missing = [c for k, (c, _) in found.items() if k not in resolved]
+        if missing:  # load existing or fix broken links
+            rows, _ = db.cypher_query('UNWIND $rows AS row MERGE (m:Molecule {cgrdb: row}) RETURN row, id(m)',
+                                      {'rows': missing})
+            ids = dict(rows)
+            resolved.update((k, ids[c]) for k, (c, _) in found.items() if k not in resolved)
+        if memo is not None:
+            memo.molecules.update((k, (resolved[k], c, s)) for k, (c, s) in found.items())
+
+        molecules = {k: (cls(id=resolved[k], cgrdb=c), s) for k, (c, s) in found.items()}
+        return [molecules[k] for k in keys]
+
+    def search_path(self, target: 'Molecule', max_len=10, network: 'ReactionNetwork' = None,
+                    bidirectional: bool = False, server: bool = False, limit: int = None, batch: bool = False):
+        """
+        Breadth-first search of paths between complexes of molecules.
+
+        :param network: in-memory snapshot of reaction network. If given, database used only for found paths.
+        :param bidirectional: skip complexes too far from targets found by backward search from targets.
+        :param server: enumerate paths by single Cypher query. Nodes of paths are loaded on demand.
+            Python search used if query failed.
+        :param limit: number of paths to enumerate in server mode
+        :param batch: fetch reactions of all complexes of search level by single query
+        """
+        if batch and network is None:
+            sources = self.complexes.all()
+            network = BatchNetwork(Complex.neighbors, {x.id: x.energy for x in sources})
+            for path in breadth_first_paths(network, [x.id for x in sources], [x.id for x in target.complexes.all()],
+                                            max_len):
+                yield inflate_path(path)
+            return
+        if server:
+            paths = search_server([x.id for x in self.complexes.all()], [x.id for x in target.complexes.all()],
+                                  max_len, limit)
+            if paths is not None:
+                yield from paths
+                return
+        if bidirectional:
+            for path in bidirectional_paths(network or DatabaseNetwork(), [x.id for x in self.complexes.all()],
+                                            [x.id for x in target.complexes.all()], max_len):
+                yield inflate_path(path)
+            return
+        if network is not None:
+            for path in network.search_path([x.id for x in self.complexes.all()],
+                                            [x.id for x in target.complexes.all()], max_len):
+                yield inflate_path(path)
+            return
         seen = set(self.complexes.all())
         final_compl = set(target.complexes.all())
         cur_compl = seen - final_compl
@@ -143,13 +423,8 @@ class Molecule(Mixin, StructuredNode, metaclass=ExtNodeMeta):
                 seen.update(new_seen)
                 old_len = len(init_path)
             cur_len = len(init_path) + 1 < max_len
-            tmp = []
-            for r in cur.reactant.all():
-                barrier = (r.energy - cur.energy)  # * 627.51 have not yet decided which units
-                # barrier = barrier if barrier > prev_barrier else prev_barrier
-                prod = r.product.all()[0]
-                tmp.append((barrier, prod, r))
-            for barrier, prod, r in sorted(tmp,key=lambda x: x[0]):
+            # rate-limiting barrier ranking implemented in get_effective_paths(rank='barrier')
+            for r, barrier, prod in sorted(Complex.outgoing(cur.id), key=lambda x: x[1]):
                 if prod in final_compl:
                     path = init_path.copy()
                     path.append((r, barrier))
@@ -162,26 +437,44 @@ class Molecule(Mixin, StructuredNode, metaclass=ExtNodeMeta):
                     path.append((prod, barrier))
                     heappush(queue, (len(path), barrier, next(n), path))
 
-    def has_path(self, target: 'Molecule'):
+    def has_path(self, target: 'Molecule', max_len: Optional[int] = 10, network: 'ReactionNetwork' = None):
+        """
+        Check existence of path between complexes of molecules.
+
+        Reactions are stored in both directions, thus component of reachability index is the set of mutually
+        reachable complexes. Any path is answered by the index without search. Path of limited length is searched
+        only for molecules in the same component.
+
+        :param max_len: path length limit. None - any path.
+        """
         if target.id == self.id:
             return False
-        return bool(next(self.search_path(target), False))
+        if not molecules_connected(self.id, target.id):
+            return False
+        if max_len is None:
+            return True
+        return bool(next(self.search_path(target, max_len, network=network, bidirectional=True), False))
 
-    def get_effective_paths(self, target: 'Molecule', limit: int = 10, max_path = 30):
+    def get_effective_paths(self, target: 'Molecule', limit: int = 10, max_path = 30,
+                            network: 'ReactionNetwork' = None, rank: str = None, server: bool = False):
+        """
+        Find pathways between molecules.
+
+        :param limit: path length limit
+        :param max_path: number of paths to return
+        :param network: in-memory snapshot of reaction network
+        :param rank: None - first found shortest paths. 'total' - k cheapest paths by sum of barriers.
+            'barrier' - k paths with the lowest rate-limiting barrier. Minimax search prunes branches with
+            barriers higher than in already found k paths.
+        :param server: find shortest paths by single Cypher query
+        """
         if limit <= 0:
             raise ValueError('limit should be positive')
-
-        paths = []
-        for path in islice(self.search_path(target, limit), max_path):
-            nodes = []
-            costs = []
-            total = 0
-            for i, (node, barrier) in enumerate(path, start=1):
-                nodes.append(node)
-                costs.append(barrier) if i % 2 == 0 else costs.append(0)
-                total += costs[-1]
-            paths.append(weighted_path(nodes, costs, total))
-        return paths
+        if rank is not None:
+            return ranked_paths([x.id for x in self.complexes.all()], [x.id for x in target.complexes.all()],
+                                limit, max_path, network, rank)
+        return [weight_path(path) for path in
+                islice(self.search_path(target, limit, network, server=server, limit=max_path), max_path)]
 
     @property
     @db_session
@@ -204,65 +497,118 @@ class Complex(Mixin, StructuredNode, metaclass=ExtNodeMeta):
     """
     signature = StringProperty(unique_index=True, required=True)  # signature of Complex
     energy = FloatProperty()
+    component = IntegerProperty(index=True)  # reachability index. label of connected component of reaction network
     brutto = RelationshipFrom('Brutto', 'B2C', cardinality=One)
     molecules = RelationshipFrom('Molecule', 'M2C', model=Mapping)  # mapping of Molecules in db into Complex
-    equilibrium_states = RelationshipFrom('EquilibriumState', 'E2C', model=Mapping)  # mapping of ES into complex
+    equilibrium_states = RelationshipFrom('EquilibriumState', 'E2C', model=M_and_V)  # mapping of ES into complex
     reactant = RelationshipTo('Reaction', 'C2R', model=M_and_B)
-    product = RelationshipFrom('Reaction', 'R2C', model=M_and_B)
+    product = RelationshipTo('Reaction', 'R2C', model=M_and_B)
 
     def __init__(self, structure: MoleculeContainer = None, **kwargs):
         if structure is not None:
-            se = structure.meta['energy']
             # load ES first for validation
             e = EquilibriumState(structure)
-
-            super().__init__(signature=str(structure), energy=se)
-            try:
-                self.save()
-            except UniqueProperty:  # already exists
-                self.id = self.nodes.get(signature=str(structure), lazy=True)  # get id of existing node
+            se = e.energy  # energy of near-duplicate ES if found
+            viewer = viewer_payload(structure, structure._conformers[0])
+
+            signature = str(structure)
+            memo = ingestion_memo()
+            known = memo.complexes.get(signature) if memo is not None else None  # id of already resolved complex
+            super().__init__(signature=signature, energy=se)
+            if known is None:
+                try:
+                    self.save()
+                except UniqueProperty:  # already exists
+                    known = self.nodes.get(signature=signature, lazy=True)  # get id of existing node
+            if known is not None:
+                self.id = known
                 self.refresh()
 
                 # new lowest ES found
-                if self.energy > se:  # this can break existing reaction barriers values!
+                if self.energy > se:
                     # check ES is new
                     if self.equilibrium_states.is_connected(e):
                         raise ValueError('same EquilibriumState with different energy exists')
                     self.energy = se
                     self.save()
-                    self.equilibrium_states.connect(e, {'mapping_json': next(structure.get_mapping(self.structure))})
+                    energy_changed(complexes=[self.id])  # barriers of existing reactions are outdated
+                    self.equilibrium_states.connect(e, {'mapping_json': next(structure.get_mapping(self.structure)),
+                                                        'viewer_json': viewer})
                 elif not self.equilibrium_states.is_connected(e):  # only new ES need connection from complex.
-                    self.equilibrium_states.connect(e, {'mapping_json': next(structure.get_mapping(self.structure))})
+                    self.equilibrium_states.connect(e, {'mapping_json': next(structure.get_mapping(self.structure)),
+                                                        'viewer_json': viewer})
             else:  # new complex. store relations into CGRdb and Brutto
+                self.component = self.id  # new complex is isolated
+                self.save()
+                structure_cache.invalidate(self.id)  # id of deleted node can be reused
                 self.brutto.connect(Brutto(structure))
                 # create mapping into molecules
-                for s in structure.split():
-                    m = Molecule(s)
-                    self.molecules.connect(m, {'mapping_json': next(m.structure.get_mapping(s))})
+                fragments = structure.split()
+                for s, (m, ms) in zip(fragments, Molecule.resolve(fragments)):
+                    self.molecules.connect(m, {'mapping_json': next(ms.get_mapping(s))})
                 # store ES as-is
-                self.equilibrium_states.connect(e, {'mapping_json': {n: n for n in structure}})
+                self.equilibrium_states.connect(e, {'mapping_json': {n: n for n in structure},
+                                                    'viewer_json': viewer})
+            if memo is not None:
+                memo.complexes[signature] = self.id
             self.__es__ = e
         else:
             super().__init__(**kwargs)
 
-    def get_effective_paths(self, target: 'Complex', limit: int = 10, max_path = 30):
+    def get_effective_paths(self, target: 'Complex', limit: int = 10, max_path = 30,
+                            network: 'ReactionNetwork' = None, rank: str = None, server: bool = False):
+        """
+        Find pathways between complexes.
+
+        :param limit: path length limit
+        :param max_path: number of paths to return
+        :param network: in-memory snapshot of reaction network
+        :param rank: None - first found shortest paths. 'total' - k cheapest paths by sum of barriers.
+            'barrier' - k paths with the lowest rate-limiting barrier. Minimax search prunes branches with
+            barriers higher than in already found k paths.
+        :param server: find shortest paths by single Cypher query
+        """
         if not limit:
             raise ValueError('limit should be positive')
+        if rank is not None:
+            return ranked_paths([self.id], [target.id], limit, max_path, network, rank)
         paths = []
-        for n, path in enumerate(self.search_path(target, limit)):
-            nodes = []
-            costs = []
-            total = 0
-            for i, (node, barrier) in enumerate(path, start=1):
-                nodes.append(node)
-                costs.append(barrier) if i % 2 == 0 else costs.append(0)
-                total += costs[-1]
-            paths.append(weighted_path(nodes, costs, total))
+        for n, path in enumerate(self.search_path(target, limit, network, server=server, limit=max_path + 1)):
+            paths.append(weight_path(path))
             if n == max_path:
                 return paths
         return paths
 
-    def search_path(self, target: 'Complex', max_len=10):
+    def search_path(self, target: 'Complex', max_len=10, network: 'ReactionNetwork' = None,
+                    bidirectional: bool = False, server: bool = False, limit: int = None, batch: bool = False):
+        """
+        Breadth-first search of paths between complexes.
+
+        :param network: in-memory snapshot of reaction network. If given, database used only for found paths.
+        :param bidirectional: skip complexes too far from targets found by backward search from targets.
+        :param server: enumerate paths by single Cypher query. Nodes of paths are loaded on demand.
+            Python search used if query failed.
+        :param limit: number of paths to enumerate in server mode
+        :param batch: fetch reactions of all complexes of search level by single query
+        """
+        if batch and network is None:
+            network = BatchNetwork(Complex.neighbors, {self.id: self.energy})
+            for path in breadth_first_paths(network, [self.id], [target.id], max_len):
+                yield inflate_path(path)
+            return
+        if server:
+            paths = search_server([self.id], [target.id], max_len, limit)
+            if paths is not None:
+                yield from paths
+                return
+        if bidirectional:
+            for path in bidirectional_paths(network or DatabaseNetwork(), [self.id], [target.id], max_len):
+                yield inflate_path(path)
+            return
+        if network is not None:
+            for path in network.search_path([self.id], [target.id], max_len):
+                yield inflate_path(path)
+            return
         seen = set()
         seen.add(self)
         final_compl = set()
@@ -284,10 +630,8 @@ class Complex(Mixin, StructuredNode, metaclass=ExtNodeMeta):
                 seen.update(new_seen)
                 old_len = len(init_path)
             cur_len = len(init_path) + 1 < max_len
-            for i, r in enumerate(cur.reactant.all()):
-                barrier = (r.energy - cur.energy)  # * 627.51
-                # barrier = barrier if barrier > prev_barrier else prev_barrier
-                prod = r.product.all()[0]
+            # rate-limiting barrier ranking implemented in get_effective_paths(rank='barrier')
+            for r, barrier, prod in self.outgoing(cur.id):
                 if prod in final_compl:
                     path = init_path.copy()
                     path.append((r, barrier))
@@ -300,9 +644,37 @@ class Complex(Mixin, StructuredNode, metaclass=ExtNodeMeta):
                     path.append((prod, barrier))
                     heappush(queue, (len(path), barrier, next(n), path))
 
+    @classmethod
+    def outgoing(cls, _id: int) -> List[Tuple['Reaction', float, 'Complex']]:
+        """
+        Outgoing reactions of complex with stored barriers and product complexes by single query.
+        """
+        rows, _ = db.cypher_query('MATCH (c:Complex)-[x:C2R]->(r:Reaction)<-[:R2C]-(p:Complex) WHERE id(c) = $id '
+                                  'RETURN r, x.energy, p', {'id': _id})
+        return [(Reaction.inflate(r), b, cls.inflate(p)) for r, b, p in rows]
+
+    @classmethod
+    def neighbors(cls, complexes: List[int]) -> List[Tuple[int, int, float, int, float, float]]:
+        """
+        Outgoing reactions of complexes by single query.
+
+        :param complexes: complexes ids
+        :return: rows of complex id, reaction id, reaction energy, product id, product energy and barrier
+        """
+        rows, _ = db.cypher_query('MATCH (c:Complex)-[x:C2R]->(r:Reaction)<-[:R2C]-(p:Complex) WHERE id(c) IN $ids '
+                                  'RETURN id(c), id(r), r.energy, id(p), p.energy, x.energy', {'ids': list(complexes)})
+        return rows
+
     @property
-    @db_session
     def structure(self):
+        structure = structure_cache.get(self.id)
+        if structure is None:
+            structure = self._structure()
+            structure_cache.put(self.id, structure)
+        return structure.copy()  # cached structure is shared and should not be changed
+
+    @db_session
+    def _structure(self):
         structure = []
         for m in set(self.molecules.all()):
             s = m.structure
@@ -315,6 +687,26 @@ class Complex(Mixin, StructuredNode, metaclass=ExtNodeMeta):
         s.clean2d()
         return s.depict()
 
+    @classmethod
+    def viewer(cls, _id: int) -> Optional[dict]:
+        """
+        3D model of the lowest ES of complex for WEB UI. Models missing in databases populated by older versions
+        are calculated and stored on first request.
+        """
+        rows, _ = db.cypher_query('MATCH (e:EquilibriumState)-[x:E2C]->(c:Complex) WHERE id(c) = $id '
+                                  'RETURN id(e), x.viewer_json ORDER BY e.energy LIMIT 1', {'id': _id})
+        if not rows:
+            return
+        e, viewer = rows[0]
+        if viewer is None:
+            node = cls[_id]
+            es = EquilibriumState[e]
+            mapping = node.equilibrium_states.relationship(es).mapping
+            viewer = viewer_payload(node.structure, {mapping[n]: v for n, v in es.xyz.items()})
+            db.cypher_query('MATCH (e:EquilibriumState)-[x:E2C]->(c:Complex) WHERE id(e) = $e AND id(c) = $c '
+                            'SET x.viewer_json = $viewer', {'e': e, 'c': _id, 'viewer': viewer})
+        return loads(viewer)
+
     def depict3d(self, index: int = 0) -> str:
         s = self.structure
         es = self.equilibrium_states.all()[index]
@@ -342,41 +734,98 @@ class Complex(Mixin, StructuredNode, metaclass=ExtNodeMeta):
 
 
 class EquilibriumState(Mixin, StructuredNode, metaclass=ExtNodeMeta):
-    xyz_json = JSONProperty()
+    xyz_json = JSONProperty()  # geometry of databases populated by older versions. see migrate_geometry
+    atoms_bin = BytesProperty()  # atom numbers packed as int32
+    xyz_bin = BytesProperty()  # coordinates of atoms in atoms_bin order packed as float64
     energy = FloatProperty()
     signature = StringProperty(unique_index=True, required=True)  # signature of EQ
-    complex = RelationshipTo('Complex', 'E2C', cardinality=One, model=Mapping)
+    bucket = StringProperty(index=True)  # spatial hash of geometry for near-duplicates search
+    canonical_bin = BytesProperty()  # coordinates in canonical order and orientation packed as float64
+    complex = RelationshipTo('Complex', 'E2C', cardinality=One, model=M_and_V)
     transition_states = RelationshipTo('TransitionState', 'E2T', model=Barrier)
 
     def __init__(self, structure: MoleculeContainer = None, **kwargs):
         if structure is not None:
             xyz = structure._conformers[0]
             energy = structure.meta['energy']
-            signature = [None] * len(structure)
-            for n, m in structure.atoms_order.items():
-                signature[m - 1] = [round(x, 4) for x in xyz[n]]
-            signature = str(signature)
-            super().__init__(xyz_json=xyz, energy=energy, signature=signature)
-            try:
-                self.save()
-            except UniqueProperty:
-                self.id = self.nodes.get(signature=signature, lazy=True)  # get id of existing node
-                self.refresh()
-                if not -.0001 < self.energy - energy < .0001:
-                    raise ValueError('same EquilibriumState with different energy exists')
+            atoms, packed = pack_xyz(xyz)
+            key = geometry_key(structure)
+            canonical = canonical_geometry(structure)
+            if dedup_config.rmsd is not None:
+                near = near_state('EquilibriumState', structure, canonical, signature_hash(key), dedup_config.rmsd)
+                if near is not None:  # reuse stored geometry and energy
+                    super().__init__(id=near)
+                    self.refresh()
+                    return
+            for signature in (signature_hash(key), key):  # full key is fallback for hash collisions
+                super().__init__(atoms_bin=atoms, xyz_bin=packed, energy=energy, signature=signature,
+                                 bucket=geometry_bucket(structure, canonical), canonical_bin=canonical.tobytes())
+                try:
+                    self.save()
+                    break
+                except UniqueProperty:
+                    self.id = self.nodes.get(signature=signature, lazy=True)  # get id of existing node
+                    self.refresh()
+                    if same_geometry(self.xyz, xyz):
+                        if not -.0001 < self.energy - energy < .0001:
+                            raise ValueError('same EquilibriumState with different energy exists')
+                        break
+                    del self.id  # different geometry with the same signature
+            else:
+                raise ValueError('EquilibriumState signature collision')
         else:
             super().__init__(**kwargs)
 
+    @classmethod
+    def index_buckets(cls, batch_size: int = 1000) -> int:
+        """
+        Store buckets and canonical geometries of ES populated by older versions for near-duplicates search.
+        Structure of ES is taken from its complex.
+
+        :return: number of indexed nodes
+        """
+        indexed = 0
+        while True:
+            rows, _ = db.cypher_query('MATCH (e:EquilibriumState)-[x:E2C]->(c:Complex) WHERE e.bucket IS NULL '
+                                      'RETURN e, x.mapping_json, id(c) LIMIT $limit', {'limit': batch_size})
+            if not rows:
+                break
+            buckets = []
+            for e, mapping, c in rows:
+                e = cls.inflate(e)
+                mapping = {int(k): v for k, v in loads(mapping).items()}
+                structure = Complex[c].structure
+                structure._conformers.clear()
+                structure._conformers.append({mapping[n]: v for n, v in e.xyz.items()})
+                canonical = canonical_geometry(structure)
+                buckets.append([e.id, geometry_bucket(structure, canonical), bytearray(canonical.tobytes())])
+            db.cypher_query('UNWIND $rows AS row MATCH (e:EquilibriumState) WHERE id(e) = row[0] '
+                            'SET e.bucket = row[1], e.canonical_bin = row[2]', {'rows': buckets})
+            indexed += len(buckets)
+        return indexed
+
     @property
     def xyz(self):
-        return {int(k): tuple(v) for k, v in self.xyz_json.items()}
+        if self.xyz_bin is None:
+            return {int(k): tuple(v) for k, v in self.xyz_json.items()}
+        atoms, xyz = self.xyz_array
+        return dict(zip(atoms.tolist(), map(tuple, xyz.tolist())))
+
+    @property
+    def xyz_array(self) -> Tuple[ndarray, ndarray]:
+        """
+        Atom numbers and (n, 3) coordinates arrays. Read-only views of stored bytes.
+        """
+        if self.xyz_bin is None:
+            return unpack_xyz(*pack_xyz(self.xyz))
+        return unpack_xyz(self.atoms_bin, self.xyz_bin)
 
 
 class Reaction(Mixin, StructuredNode, metaclass=ExtNodeMeta):
     signature = StringProperty(unique_index=True, required=True)  # signature of ES2ES CGR
     energy = FloatProperty()
     brutto = RelationshipFrom('Brutto', 'B2R', cardinality=One)
-    transition_states = RelationshipFrom('TransitionState', 'T2R', model=Mapping)
+    transition_states = RelationshipFrom('TransitionState', 'T2R', model=M_and_V)
     reactant = RelationshipFrom('Complex', 'C2R', cardinality=One, model=M_and_B)
     product = RelationshipFrom('Complex', 'R2C', cardinality=One, model=M_and_B)
 
@@ -389,16 +838,17 @@ class Reaction(Mixin, StructuredNode, metaclass=ExtNodeMeta):
             r = structure.reactants[0]
             p = structure.products[0]
             t = structure.reagents[0]
-            te = t.meta['energy']
 
             # store TS ans ES's first for validation
             ts = TransitionState(t)
+            te = ts.energy  # energy of near-duplicate TS if found
             rc = Complex(r)
             pc = Complex(p)
             re = rc.__es__
             pe = pc.__es__
 
             cgr = r ^ p
+            viewer = viewer_payload(cgr, t._conformers[0])
             super().__init__(signature=str(cgr), energy=te)
             try:
                 self.save()
@@ -411,35 +861,47 @@ class Reaction(Mixin, StructuredNode, metaclass=ExtNodeMeta):
                         raise ValueError('same TransitionState with different energy exists')
                     self.energy = te
                     self.save()
-                    self.transition_states.connect(ts, {'mapping_json': next(cgr.get_mapping(self.structure))})
+                    self.transition_states.connect(ts, {'mapping_json': next(cgr.get_mapping(self.structure)),
+                                                        'viewer_json': viewer})
 
                     # new barriers!
-                    self.reactant.relationship(rc).energy = te - rc.energy
-                    self.product.relationship(pc).energy = te - pc.energy
+                    energy_changed(reactions=[self.id])
                 elif not self.transition_states.is_connected(ts):  # skip already connected TS
-                    self.transition_states.connect(ts, {'mapping_json': next(cgr.get_mapping(self.structure))})
+                    self.transition_states.connect(ts, {'mapping_json': next(cgr.get_mapping(self.structure)),
+                                                        'viewer_json': viewer})
             else:  # new reaction
+                structure_cache.invalidate(self.id)  # id of deleted node can be reused
                 # store relation to Brutto
                 self.brutto.connect(Brutto(t))
 
                 # connect reactant and product complexes.
                 self.reactant.connect(rc, {'mapping_json': next(rc.structure.get_mapping(r)), 'energy': te - rc.energy})
                 self.product.connect(pc, {'mapping_json': next(pc.structure.get_mapping(p)), 'energy': te - pc.energy})
+                merge_components(rc.id, pc.id)
 
                 # connect TS to R
-                self.transition_states.connect(ts, {'mapping_json': {n: n for n in t}})
+                self.transition_states.connect(ts, {'mapping_json': {n: n for n in t},
+                                                    'viewer_json': viewer})
 
             # connect new TS to new ES`s
             if not ts.equilibrium_states.is_connected(re):  # skip already connected TS-ES
                 ts.equilibrium_states.connect(re, {'energy': te - re.energy})
             if not ts.equilibrium_states.is_connected(pe):  # skip already connected TS-ES
                 ts.equilibrium_states.connect(pe, {'energy': te - pe.energy})
+            stale_summaries([Brutto(t).id])  # new reaction or energies of complexes and reaction can be changed
         else:
             super().__init__(**kwargs)
 
     @property
-    @db_session
     def structure(self):
+        structure = structure_cache.get(self.id)
+        if structure is None:
+            structure = self._structure()
+            structure_cache.put(self.id, structure)
+        return structure.copy()  # cached structure is shared and should not be changed
+
+    @db_session
+    def _structure(self):
         r = self.reactant.single()
         p = self.product.single()
         r = r.structure.remap(self.reactant.relationship(r).mapping, copy=True)
@@ -451,6 +913,26 @@ class Reaction(Mixin, StructuredNode, metaclass=ExtNodeMeta):
         s.clean2d()
         return s.depict()
 
+    @classmethod
+    def viewer(cls, _id: int) -> Optional[dict]:
+        """
+        3D model of the lowest TS of reaction for WEB UI. Models missing in databases populated by older versions
+        are calculated and stored on first request.
+        """
+        rows, _ = db.cypher_query('MATCH (t:TransitionState)-[x:T2R]->(r:Reaction) WHERE id(r) = $id '
+                                  'RETURN id(t), x.viewer_json ORDER BY t.energy LIMIT 1', {'id': _id})
+        if not rows:
+            return
+        t, viewer = rows[0]
+        if viewer is None:
+            node = cls[_id]
+            ts = TransitionState[t]
+            mapping = node.transition_states.relationship(ts).mapping
+            viewer = viewer_payload(node.structure, {mapping[n]: v for n, v in ts.xyz.items()})
+            db.cypher_query('MATCH (t:TransitionState)-[x:T2R]->(r:Reaction) WHERE id(t) = $t AND id(r) = $r '
+                            'SET x.viewer_json = $viewer', {'t': t, 'r': _id, 'viewer': viewer})
+        return loads(viewer)
+
     def depict3d(self, index: int = 0) -> str:
         s = self.structure
         ts = self.transition_states.all()[index]
@@ -476,34 +958,76 @@ class Reaction(Mixin, StructuredNode, metaclass=ExtNodeMeta):
 
 
 class TransitionState(Mixin, StructuredNode, metaclass=ExtNodeMeta):
-    xyz_json = JSONProperty()
+    xyz_json = JSONProperty()  # geometry of databases populated by older versions. see migrate_geometry
+    atoms_bin = BytesProperty()  # atom numbers packed as int32
+    xyz_bin = BytesProperty()  # coordinates of atoms in atoms_bin order packed as float64
     energy = FloatProperty()
     signature = StringProperty(unique_index=True, required=True)  # signature of TS
-    reaction = RelationshipTo('Reaction', 'T2R', cardinality=One, model=Mapping)
+    bucket = StringProperty(index=True)  # spatial hash of geometry for near-duplicates search
+    canonical_bin = BytesProperty()  # coordinates in canonical order and orientation packed as float64
+    reaction = RelationshipTo('Reaction', 'T2R', cardinality=One, model=M_and_V)
     equilibrium_states = RelationshipFrom('EquilibriumState', 'E2T', model=Barrier)
 
     def __init__(self, structure: MoleculeContainer = None, **kwargs):
         if structure is not None:
             xyz = structure._conformers[0]
             energy = structure.meta['energy']
-            signature = [None] * len(structure)
-            for n, m in structure.atoms_order.items():
-                signature[m - 1] = [round(x, 4) for x in xyz[n]]
-            signature = str(signature)
-            super().__init__(xyz_json=xyz, energy=energy, signature=signature)
-            try:
-                self.save()
-            except UniqueProperty:
-                self.id = self.nodes.get(signature=signature, lazy=True)  # get id of existing node
-                self.refresh()
-                if not -.0001 < self.energy - energy < .0001:
-                    raise ValueError('same TransitionState with different energy exists')
+            atoms, packed = pack_xyz(xyz)
+            key = geometry_key(structure)
+            canonical = canonical_geometry(structure)
+            if dedup_config.rmsd is not None:
+                near = near_state('TransitionState', structure, canonical, signature_hash(key), dedup_config.rmsd)
+                if near is not None:  # reuse stored geometry and energy
+                    super().__init__(id=near)
+                    self.refresh()
+                    return
+            for signature in (signature_hash(key), key):  # full key is fallback for hash collisions
+                super().__init__(atoms_bin=atoms, xyz_bin=packed, energy=energy, signature=signature,
+                                 bucket=geometry_bucket(structure, canonical), canonical_bin=canonical.tobytes())
+                try:
+                    self.save()
+                    break
+                except UniqueProperty:
+                    self.id = self.nodes.get(signature=signature, lazy=True)  # get id of existing node
+                    self.refresh()
+                    if same_geometry(self.xyz, xyz):
+                        if not -.0001 < self.energy - energy < .0001:
+                            raise ValueError('same TransitionState with different energy exists')
+                        break
+                    del self.id  # different geometry with the same signature
+            else:
+                raise ValueError('TransitionState signature collision')
         else:
             super().__init__(**kwargs)
 
     @property
     def xyz(self):
-        return {int(k): tuple(v) for k, v in self.xyz_json.items()}
+        if self.xyz_bin is None:
+            return {int(k): tuple(v) for k, v in self.xyz_json.items()}
+        atoms, xyz = self.xyz_array
+        return dict(zip(atoms.tolist(), map(tuple, xyz.tolist())))
+
+    @property
+    def xyz_array(self) -> Tuple[ndarray, ndarray]:
+        """
+        Atom numbers and (n, 3) coordinates arrays. Read-only views of stored bytes.
+        """
+        if self.xyz_bin is None:
+            return unpack_xyz(*pack_xyz(self.xyz))
+        return unpack_xyz(self.atoms_bin, self.xyz_bin)
+
+
+class LogFile(Mixin, StructuredNode, metaclass=ExtNodeMeta):
+    """
+    Manifest of populated log files
+    """
+    path = StringProperty(unique_index=True, required=True)
+    hash = StringProperty(index=True)  # sha256 of content
+    size = IntegerProperty()
+    mtime = FloatProperty()
+    status = StringProperty()  # processed, duplicate, invalid or failed. failed files are loaded again
+    reactions = ArrayProperty(IntegerProperty())  # ids of loaded reactions
 
 
-__all__ = ['Molecule', 'Reaction', 'EquilibriumState', 'TransitionState', 'Barrier', 'Mapping', 'Complex', 'Brutto']
+__all__ = ['Molecule', 'Reaction', 'EquilibriumState', 'TransitionState', 'Barrier', 'Mapping', 'Complex', 'Brutto',
+           'LogFile']
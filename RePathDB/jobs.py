@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2021 Ramil Nugmanov <nougmanoff@protonmail.com>
+#  Copyright 2021 Timur Gimadiev <timur.gimadiev@gmail.com>
+#  This file is part of RePathDB.
+#
+#  RePathDB is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, see <https://www.gnu.org/licenses/>.
+#
+"""
+Background processing of uploaded archives.
+
+Jobs are executed one by one in a worker thread of the WEB UI process, so database writes of different uploads are
+not interleaved. Each job has per-file status and can be cancelled between files.
+
+Log files are streamed from zip and tar archives without extraction to disk and parsed in worker processes.
+Uploaded files which are neither archives nor log files are reported as invalid.
+Parsed files are written in batches by bulk loader.
+"""
+from bz2 import open as bz2_open
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from gzip import open as gzip_open
+from logging import getLogger
+from lzma import LZMAError, open as xz_open
+from os import remove
+from pathlib import Path
+from tarfile import is_tarfile, open as tar_open
+from threading import Event, Lock
+from time import time
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+from uuid import uuid4
+from zipfile import ZipFile, is_zipfile
+from .bulk import BulkLoader
+from .cache import ingestion_session
+from .energy import recompute_changed
+from .network import update_summaries
+from .populate import parse_log
+
+
+logger = getLogger(__name__)
+
+
+compressors = {'.gz': gzip_open, '.bz2': bz2_open, '.xz': xz_open}  # compressed plain log files
+
+
+def _skip(name: str, suffix: str) -> bool:
+    return not name.endswith(suffix) or name.startswith('__MACOSX/') or name.rsplit('/', 1)[-1].startswith('._')
+
+
+def iter_members(file: Path, suffix: str) -> Iterator[Tuple[str, Optional[bytes]]]:
+    """
+    Stream log files from uploaded zip or tar archive or plain log file without extraction to disk.
+    Plain log file can be compressed by gzip, bzip2 or xz.
+
+    :param suffix: the log-file extension. other members are ignored
+    :return: pairs of archive/member name and content. None instead of content of unsupported uploaded file
+    """
+    if file.name.endswith(suffix):
+        yield file.name, file.read_bytes()
+    elif is_zipfile(str(file)):
+        with ZipFile(str(file)) as archive:
+            for info in archive.infolist():
+                if not info.filename.endswith('/') and not _skip(info.filename, suffix):
+                    yield f'{file.name}/{info.filename}', archive.read(info)
+    elif is_tarfile(str(file)):
+        with tar_open(str(file), 'r|*') as archive:  # sequential reading of compressed stream
+            for info in archive:
+                if info.isfile() and not _skip(info.name, suffix):
+                    yield f'{file.name}/{info.name}', archive.extractfile(info).read()
+    else:
+        for extension, decompress in compressors.items():
+            if file.name.endswith(extension) and file.name[:-len(extension)].endswith(suffix):
+                try:
+                    with decompress(str(file)) as f:
+                        data = f.read()
+                except (OSError, EOFError, LZMAError):  # broken or not compressed file
+                    break
+                yield file.name, data
+                return
+        yield file.name, None
+
+
+class Job:
+    def __init__(self, archives: Iterable[Path], suffix: str = '.log', workers: int = 1, batch_size: int = 100,
+                 initializer: Optional[Callable] = None):
+        """
+        :param archives: paths of uploaded zip or tar archives or plain log files
+        :param suffix: the log-file extension
+        :param workers: number of parsing processes
+        :param batch_size: number of files written in one transaction
+        :param initializer: function called in worker thread before processing. e.g. database session setup
+        """
+        self.id = uuid4().hex
+        self.archives = list(archives)
+        self.suffix = suffix
+        self.workers = workers
+        self.batch_size = batch_size
+        self.initializer = initializer
+        self.state = 'queued'  # queued, running, done, cancelled, failed
+        self.error = None
+        self.files = OrderedDict()  # archive/member: queued, processed, invalid, failed, cancelled
+        self.created = time()
+        self.finished = None
+        self.cancelled = Event()
+        self._lock = Lock()
+
+    @property
+    def report(self) -> dict:
+        with self._lock:
+            files = list(self.files.items())
+        counts = Counter(x for _, x in files)
+        done = sum(v for k, v in counts.items() if k not in ('queued', 'cancelled'))
+        return {'id': self.id, 'state': self.state, 'error': self.error, 'total': len(files), 'done': done,
+                'counts': dict(counts), 'files': files}
+
+    def run(self):
+        if self.cancelled.is_set():
+            self.state = 'cancelled'
+            self._cleanup()
+            return
+        self.state = 'running'
+        executor = ProcessPoolExecutor(self.workers) if self.workers > 1 else None
+        try:
+            if self.initializer is not None:
+                self.initializer()
+            loader = BulkLoader()
+            with ingestion_session():
+                batch = []
+                for name, records in self._parse(executor):
+                    if self.cancelled.is_set():
+                        for n, _ in batch:
+                            self._set(n, 'cancelled')
+                        batch = []
+                        self._set(name, 'cancelled')
+                        continue
+                    batch.append((name, records))
+                    if len(batch) == self.batch_size:
+                        self._write(loader, batch)
+                        batch = []
+                if batch:
+                    self._write(loader, batch)
+                recompute_changed()
+            update_summaries()
+        except Exception as e:
+            logger.exception('upload job %s failed', self.id)
+            self.state = 'failed'
+            self.error = str(e)
+        else:
+            self.state = 'cancelled' if self.cancelled.is_set() else 'done'
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            self._cleanup()
+
+    def _parse(self, executor):
+        """
+        Parse streamed log files keeping limited number of files in flight.
+        """
+        members = (m for file in self.archives for m in iter_members(file, self.suffix))
+        if executor is None:
+            for item in members:
+                if self.cancelled.is_set():
+                    break
+                self._set(item[0], 'queued')
+                yield parse_log(item) if item[1] is not None else item  # unsupported file is invalid
+            return
+        pending = deque()
+        for item in members:
+            if self.cancelled.is_set():
+                break
+            self._set(item[0], 'queued')
+            if item[1] is None:  # unsupported file is invalid
+                yield item
+                continue
+            pending.append(executor.submit(parse_log, item))
+            if len(pending) >= 2 * self.workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    def _write(self, loader: BulkLoader, batch):
+        try:
+            status = loader.write(batch)
+        except Exception:  # batch transaction rolled back. load files one by one
+            logger.exception('batch of upload job %s failed. files are loaded one by one', self.id)
+            status = loader.write_each(batch)
+        for name, (s, _) in status.items():
+            self._set(name, s)
+
+    def _set(self, name: str, status: str):
+        with self._lock:
+            self.files[name] = status
+
+    def _cleanup(self):
+        self.finished = time()
+        for file in self.archives:
+            try:
+                remove(str(file))
+            except OSError:
+                pass
+
+
+class JobQueue:
+    """
+    Registry and executor of upload jobs. Finished jobs are kept for polling up to given number.
+    """
+    def __init__(self, keep: int = 100, suffix: str = '.log', workers: int = 1, batch_size: int = 100,
+                 initializer: Optional[Callable] = None):
+        """
+        :param keep: number of finished jobs available for polling
+        :param suffix: the log-file extension
+        :param workers: number of parsing processes of job
+        :param batch_size: number of files written in one transaction
+        :param initializer: function called in worker thread before each job
+        """
+        self.keep = keep
+        self.suffix = suffix
+        self.workers = workers
+        self.batch_size = batch_size
+        self.initializer = initializer
+        self._jobs = OrderedDict()
+        self._lock = Lock()
+        self._executor = ThreadPoolExecutor(1)
+
+    def submit(self, archives: Iterable[Path]) -> str:
+        """
+        Queue processing of uploaded files. Files are removed after processing.
+
+        :return: job id
+        """
+        job = Job(archives, self.suffix, self.workers, self.batch_size, self.initializer)
+        with self._lock:
+            self._jobs[job.id] = job
+            finished = [k for k, v in self._jobs.items() if v.finished is not None]
+            for k in finished[:max(0, len(finished) - self.keep)]:
+                del self._jobs[k]
+        self._executor.submit(job.run)
+        return job.id
+
+    def status(self, job_id: str) -> Optional[dict]:
+        """
+        Progress of job or None for unknown job.
+        """
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job.report
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Stop job. Files of already written batches are kept in database.
+
+        :return: False for unknown or finished job
+        """
+        job = self._jobs.get(job_id)
+        if job is None or job.finished is not None:
+            return False
+        job.cancelled.set()
+        return True
+
+
+__all__ = ['JobQueue']
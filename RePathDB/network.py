@@ -0,0 +1,658 @@
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2021 Ramil Nugmanov <nougmanoff@protonmail.com>
+#  Copyright 2021 Timur Gimadiev <timur.gimadiev@gmail.com>
+#  This file is part of RePathDB.
+#
+#  RePathDB is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, see <https://www.gnu.org/licenses/>.
+#
+from array import array
+from collections import Counter, deque
+from json import dumps, loads
+from neomodel import db
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from .search import breadth_first_paths
+
+
+class BruttoNetwork:
+    """
+    Compact CSR snapshot of the reaction network of one Brutto.
+
+    Complexes are stored by local index. Outgoing reactions of complex `i` are in
+    `reactions[offsets[i]:offsets[i + 1]]` ordered by TS energy.
+    Incoming reactions of complex `i` are edges `incoming[in_offsets[i]:in_offsets[i + 1]]`.
+    Barriers of edges are stored on C2R relationships.
+    """
+    __slots__ = ('brutto', 'complexes', 'energies', 'offsets', 'reactions', 'reaction_energies', 'barriers',
+                 'reactants', 'products', 'in_offsets', 'incoming', 'index')
+
+    def __init__(self, brutto: int, complexes: Iterable[Tuple[int, float]],
+                 reactions: Iterable[Tuple[int, int, float, int, float]]):
+        """
+        :param brutto: Brutto node id
+        :param complexes: pairs of complex id and complex energy
+        :param reactions: tuples of reactant complex id, reaction id, TS energy, product complex id and barrier
+        """
+        self.brutto = brutto
+        self.complexes = array('q')
+        self.energies = array('d')
+        self.index = index = {}
+        for n, (c, e) in enumerate(sorted(complexes)):
+            index[c] = n
+            self.complexes.append(c)
+            self.energies.append(e)
+
+        edges = sorted((index[c], e, r, index[p], b) for c, r, e, p, b in reactions)
+        self.offsets = offsets = array('q', [0] * (len(index) + 1))
+        self.reactions = array('q', (r for _, _, r, _, _ in edges))
+        self.reaction_energies = array('d', (e for _, e, _, _, _ in edges))
+        self.barriers = array('d', (b for *_, b in edges))
+        self.reactants = array('q', (c for c, *_ in edges))
+        self.products = array('q', (p for _, _, _, p, _ in edges))
+        for c, *_ in edges:
+            offsets[c + 1] += 1
+        for n in range(len(index)):
+            offsets[n + 1] += offsets[n]
+
+        self.incoming = array('q', sorted(range(len(edges)), key=lambda x: (edges[x][3], edges[x][1])))
+        self.in_offsets = in_offsets = array('q', [0] * (len(index) + 1))
+        for _, _, _, p, _ in edges:
+            in_offsets[p + 1] += 1
+        for n in range(len(index)):
+            in_offsets[n + 1] += in_offsets[n]
+
+    @classmethod
+    def load(cls, brutto: int) -> 'BruttoNetwork':
+        """
+        Load snapshot of Brutto network from Neo4j in two queries.
+
+        :param brutto: Brutto node id
+        """
+        complexes, _ = db.cypher_query('MATCH (b:Brutto)-[:B2C]->(c:Complex) WHERE id(b) = $brutto '
+                                       'RETURN id(c), c.energy', {'brutto': brutto})
+        reactions, _ = db.cypher_query('MATCH (b:Brutto)-[:B2R]->(r:Reaction), '
+                                       '(c:Complex)-[x:C2R]->(r)<-[:R2C]-(p:Complex) WHERE id(b) = $brutto '
+                                       'RETURN id(c), id(r), r.energy, id(p), x.energy', {'brutto': brutto})
+        return cls(brutto, complexes, reactions)
+
+    def successors(self, complex_: int) -> Iterator[Tuple[int, float, int]]:
+        """
+        Outgoing reactions of complex as reaction id, barrier and product complex id.
+        """
+        n = self.index[complex_]
+        for i in range(self.offsets[n], self.offsets[n + 1]):
+            yield self.reactions[i], self.barriers[i], self.complexes[self.products[i]]
+
+    def predecessors(self, complex_: int) -> Iterator[Tuple[int, float, int]]:
+        """
+        Incoming reactions of complex as reaction id, barrier and reactant complex id.
+        """
+        n = self.index[complex_]
+        for i in self.incoming[self.in_offsets[n]:self.in_offsets[n + 1]]:
+            yield self.reactions[i], self.barriers[i], self.complexes[self.reactants[i]]
+
+    def energy(self, complex_: int) -> float:
+        return self.energies[self.index[complex_]]
+
+    def summary(self) -> dict:
+        """
+        Overview of network for drawing.
+
+        :return: nodes as [complex id, energy, degree, size] and links as
+            [reactant complex id, product complex id, reaction id, TS energy, count] lists.
+            size of node and count of link are number of merged complexes and reactions in coarsened summary.
+        """
+        complexes = self.complexes
+        degrees = [0] * len(complexes)
+        links = []
+        for c, r, e, p in zip(self.reactants, self.reactions, self.reaction_energies, self.products):
+            degrees[c] += 1
+            degrees[p] += 1
+            links.append([complexes[c], complexes[p], r, e, 1])
+        return {'nodes': [[c, e, d, 1] for c, e, d in zip(complexes, self.energies, degrees)], 'links': links}
+
+    def __contains__(self, complex_: int):
+        return complex_ in self.index
+
+    def __len__(self):
+        return len(self.complexes)
+
+
+class ReactionNetwork:
+    """
+    In-memory snapshot of reaction networks for path searches without database round-trips.
+
+    Networks are stored per Brutto and can be loaded or refreshed independently.
+    Snapshot is safe for sharing between requests of web worker.
+    """
+    def __init__(self):
+        self._networks: Dict[int, BruttoNetwork] = {}
+        self._complexes: Dict[int, BruttoNetwork] = {}  # complex id to network map
+
+    @classmethod
+    def load(cls, bruttos: Optional[Iterable[int]] = None) -> 'ReactionNetwork':
+        """
+        Load snapshot of given or all Bruttos.
+
+        :param bruttos: Brutto node ids. Load all if None.
+        """
+        self = cls()
+        if bruttos is None:
+            bruttos = [x for x, in db.cypher_query('MATCH (b:Brutto) RETURN id(b)')[0]]
+        for b in bruttos:
+            self.refresh(b)
+        return self
+
+    def refresh(self, brutto: int) -> BruttoNetwork:
+        """
+        Reload network of Brutto from database.
+
+        :param brutto: Brutto node id
+        """
+        self.discard(brutto)
+        self._networks[brutto] = network = BruttoNetwork.load(brutto)
+        for c in network.complexes:
+            self._complexes[c] = network
+        return network
+
+    def discard(self, brutto: int):
+        """
+        Remove network of Brutto from snapshot.
+        """
+        network = self._networks.pop(brutto, None)
+        if network is not None:
+            for c in network.complexes:
+                if self._complexes.get(c) is network:
+                    del self._complexes[c]
+
+    def network(self, complex_: int) -> BruttoNetwork:
+        return self._complexes[complex_]
+
+    def successors(self, complex_: int) -> Iterator[Tuple[int, float, int]]:
+        """
+        Outgoing reactions of complex as reaction id, barrier and product complex id.
+        Complexes of not loaded Bruttos don't have successors.
+        """
+        try:
+            network = self._complexes[complex_]
+        except KeyError:
+            return iter(())
+        return network.successors(complex_)
+
+    def predecessors(self, complex_: int) -> Iterator[Tuple[int, float, int]]:
+        """
+        Incoming reactions of complex as reaction id, barrier and reactant complex id.
+        """
+        try:
+            network = self._complexes[complex_]
+        except KeyError:
+            return iter(())
+        return network.predecessors(complex_)
+
+    def energy(self, complex_: int) -> float:
+        return self._complexes[complex_].energy(complex_)
+
+    @property
+    def bruttos(self) -> List[int]:
+        return list(self._networks)
+
+    def __contains__(self, complex_: int):
+        return complex_ in self._complexes
+
+    def __len__(self):
+        return len(self._complexes)
+
+    def search_path(self, sources: Iterable[int], targets: Iterable[int],
+                    max_len: int = 10) -> Iterator[List[Tuple[int, float]]]:
+        """
+        Breadth-first search of paths between complexes sets. Same as `Complex.search_path`, but on ids.
+
+        :return: paths as lists of (node id, barrier) pairs. Complexes on even and reactions on odd positions.
+        """
+        return breadth_first_paths(self, sources, targets, max_len)
+
+
+class DatabaseNetwork:
+    """
+    Lazy view of reaction network stored in Neo4j with the same interface as ReactionNetwork.
+
+    Outgoing reactions of each complex are fetched by one query on first access and memorized.
+    Should be used for single search only.
+    """
+    def __init__(self):
+        self._successors: Dict[int, List[Tuple[int, float, int]]] = {}
+        self._predecessors: Dict[int, List[Tuple[int, float, int]]] = {}
+        self._energies: Dict[int, float] = {}
+        self.queries = 0  # number of database round-trips
+
+    def successors(self, complex_: int) -> List[Tuple[int, float, int]]:
+        try:
+            return self._successors[complex_]
+        except KeyError:
+            pass
+        rows, _ = db.cypher_query('MATCH (c:Complex) WHERE id(c) = $id '
+                                  'OPTIONAL MATCH (c)-[x:C2R]->(r:Reaction)<-[:R2C]-(p:Complex) '
+                                  'RETURN c.energy, id(r), x.energy, id(p) ORDER BY r.energy', {'id': complex_})
+        self.queries += 1
+        self._successors[complex_] = out = []
+        for e, r, b, p in rows:
+            self._energies[complex_] = e
+            if r is not None:
+                out.append((r, b, p))
+        return out
+
+    def predecessors(self, complex_: int) -> List[Tuple[int, float, int]]:
+        try:
+            return self._predecessors[complex_]
+        except KeyError:
+            pass
+        rows, _ = db.cypher_query('MATCH (p:Complex)-[:R2C]->(r:Reaction)<-[x:C2R]-(c:Complex) WHERE id(p) = $id '
+                                  'RETURN c.energy, id(r), x.energy, id(c) ORDER BY r.energy', {'id': complex_})
+        self.queries += 1
+        self._predecessors[complex_] = out = []
+        for e, r, b, c in rows:
+            self._energies[c] = e
+            out.append((r, b, c))
+        return out
+
+    def energy(self, complex_: int) -> float:
+        if complex_ not in self._energies:
+            self.successors(complex_)
+        return self._energies[complex_]
+
+
+class BatchNetwork:
+    """
+    Lazy view of reaction network stored in Neo4j with level-batched loading.
+
+    Outgoing reactions of all complexes of search level are fetched by one query in `prefetch`.
+    Complexes missed in prefetch are fetched one by one.
+    """
+    def __init__(self, fetch: Callable[[List[int]], Iterable[Tuple[int, int, float, int, float, float]]],
+                 energies: Dict[int, float]):
+        """
+        :param fetch: loader of (complex id, reaction id, TS energy, product id, product energy, barrier) rows
+            for list of complexes ids. E.g. `Complex.neighbors`.
+        :param energies: energies of source complexes
+        """
+        self._fetch = fetch
+        self._successors: Dict[int, List[Tuple[int, float, int]]] = {}
+        self._energies = dict(energies)
+        self.queries = 0  # number of database round-trips
+
+    def prefetch(self, complexes: Iterable[int]):
+        complexes = [x for x in complexes if x not in self._successors]
+        if not complexes:
+            return
+        rows = self._fetch(complexes)
+        self.queries += 1
+        for c in complexes:
+            self._successors[c] = []
+        energies = self._energies
+        for c, r, _, p, pe, b in sorted(rows, key=lambda x: x[2]):
+            energies[p] = pe
+            self._successors[c].append((r, b, p))
+
+    def successors(self, complex_: int) -> List[Tuple[int, float, int]]:
+        if complex_ not in self._successors:
+            self.prefetch([complex_])
+        return self._successors[complex_]
+
+    def energy(self, complex_: int) -> float:
+        return self._energies[complex_]
+
+
+def network_summary(brutto: int, max_nodes: Optional[int] = None, keep: Iterable[int] = ()) -> dict:
+    """
+    Precomputed overview of reaction network of Brutto fetched in one read. Missing summary is rebuilt.
+
+    :param brutto: Brutto node id
+    :param max_nodes: coarsen summary of bigger networks. see `coarsen_summary`
+    :param keep: complexes ids never merged in coarsening
+    """
+    rows, _ = db.cypher_query('MATCH (b:Brutto) WHERE id(b) = $brutto RETURN b.network_json', {'brutto': brutto})
+    if not rows:
+        raise KeyError(brutto)
+    summary, = rows[0]
+    if summary is None:  # stale after ingestion
+        summary = update_summary(brutto)
+    else:
+        summary = loads(summary)
+    if max_nodes is not None and len(summary['nodes']) > max_nodes:
+        return coarsen_summary(summary, max_nodes, keep)
+    return summary
+
+
+def update_summary(brutto: int) -> dict:
+    """
+    Rebuild and store overview of reaction network of Brutto.
+    """
+    summary = BruttoNetwork.load(brutto).summary()
+    db.cypher_query('MATCH (b:Brutto) WHERE id(b) = $brutto SET b.network_json = $summary',
+                    {'brutto': brutto, 'summary': dumps(summary, separators=(',', ':'))})
+    return summary
+
+
+def update_summaries() -> int:
+    """
+    Rebuild overviews of reaction networks of Bruttos changed by ingestion.
+
+    :return: number of rebuilt summaries
+    """
+    bruttos, _ = db.cypher_query('MATCH (b:Brutto) WHERE b.network_json IS NULL RETURN id(b)')
+    for b, in bruttos:
+        update_summary(b)
+    return len(bruttos)
+
+
+def stale_summaries(bruttos: Iterable[int]):
+    """
+    Mark overviews of reaction networks of Bruttos as outdated. Should be called on changes of complexes and reactions.
+    """
+    db.cypher_query('MATCH (b:Brutto) WHERE id(b) IN $bruttos REMOVE b.network_json', {'bruttos': list(bruttos)})
+
+
+def coarsen_summary(summary: dict, max_nodes: int, keep: Iterable[int] = ()) -> dict:
+    """
+    Reduce network overview to given number of nodes.
+
+    Kept complexes and complexes of highest degree are hubs. Other complexes are merged into the nearest hub by
+    breadth-first search. Complexes unreachable from hubs are hidden.
+
+    :return: summary of the same format. number of hidden complexes is stored in `hidden` key
+    """
+    keep = [x for x in keep if any(x == n[0] for n in summary['nodes'])]
+    hubs = set(keep)
+    for n in sorted(summary['nodes'], key=lambda x: (-x[2], x[1])):
+        if len(hubs) >= max_nodes:
+            break
+        hubs.add(n[0])
+
+    adjacency = _adjacency(summary)
+    group = {h: h for h in hubs}
+    queue = deque(sorted(hubs))
+    while queue:
+        n = queue.popleft()
+        for m in adjacency[n]:
+            if m not in group:
+                group[m] = group[n]
+                queue.append(m)
+    return _contract(summary, group)
+
+
+def network_view(brutto: int, max_nodes: int = 200, focus: Iterable[int] = (), hops: Optional[int] = None,
+                 window: Optional[float] = None, communities: Iterable[int] = ()) -> dict:
+    """
+    Bounded-size view of reaction network of Brutto.
+
+    Network is filtered by energy window and neighborhood of focus complexes. Filtered network bigger than
+    `max_nodes` is shown as communities of complexes. Communities are nodes with negative ids, which can be
+    expanded by drill-down. Focus complexes are never merged into communities.
+
+    :param focus: complexes ids in the center of view
+    :param hops: keep complexes reachable from focus complexes in given number of reactions
+    :param window: keep complexes and reactions with energy not higher than the lowest energy of focus complexes
+        (or of the network) plus window in hartree
+    :param communities: drill-down path. ids of expanded community nodes of consecutive views
+    :return: summary of the same format as `network_summary`
+    """
+    summary = network_summary(brutto)
+    energies = {c: e for c, e, *_ in summary['nodes']}
+    focus = [x for x in focus if x in energies]
+    keep = set(energies)
+    if window is not None and energies:
+        threshold = min(energies[x] for x in focus or energies) + window
+        keep = {c for c, e in energies.items() if e <= threshold}
+        keep.update(focus)
+        summary = _subgraph(summary, keep, threshold)
+    if hops is not None and focus:
+        keep = _neighborhood(summary, focus, hops)
+        summary = _subgraph(summary, keep)
+    for community in communities:  # drill-down
+        labels = label_propagation(summary)
+        summary = _subgraph(summary, {c for c, x in labels.items() if -x - 1 == community} | set(focus))
+    if len(summary['nodes']) <= max_nodes:
+        return summary
+
+    labels = label_propagation(summary)
+    if len({x for c, x in labels.items() if c not in focus}) < 2:  # single community. drill-down is useless
+        return coarsen_summary(summary, max_nodes, focus)
+    view = _contract(summary, {c: c if c in focus else -x - 1 for c, x in labels.items()})
+    if len(view['nodes']) > max_nodes:
+        view = coarsen_summary(view, max_nodes, focus)
+    return view
+
+
+def label_propagation(summary: dict, iterations: int = 20) -> Dict[int, int]:
+    """
+    Deterministic community detection by label propagation. Ties are broken by the smallest label.
+
+    Vote of neighbor is weighted by number of common neighbors. Otherwise labels flow through bridges between
+    dense groups on the first sweep, when all votes are tied.
+
+    :return: complex id to community label map. label is complex id of community member
+    """
+    adjacency = _adjacency(summary)
+    neighbors = {c: set(x) for c, x in adjacency.items()}
+    weights = {c: [(x, 1 + len(neighbors[c] & neighbors[x])) for x in adjacency[c]] for c in adjacency}
+    labels = {c: c for c in adjacency}
+    order = sorted(adjacency)
+    for _ in range(iterations):
+        changed = False
+        for c in order:
+            if not adjacency[c]:
+                continue
+            counts = Counter()
+            for x, w in weights[c]:
+                counts[labels[x]] += w
+            best = max(counts.values())
+            label = min(x for x, n in counts.items() if n == best)
+            if label != labels[c] and counts.get(labels[c]) != best:
+                labels[c] = label
+                changed = True
+        if not changed:
+            break
+    return labels
+
+
+def _adjacency(summary: dict) -> Dict[int, List[int]]:
+    adjacency = {n[0]: [] for n in summary['nodes']}
+    for c, p, *_ in summary['links']:
+        adjacency[c].append(p)
+        adjacency[p].append(c)
+    return adjacency
+
+
+def _neighborhood(summary: dict, centers: Iterable[int], hops: int) -> set:
+    adjacency = _adjacency(summary)
+    seen = set(centers)
+    level = list(seen)
+    for _ in range(hops):
+        level = [m for n in level for m in adjacency[n] if m not in seen]
+        seen.update(level)
+    return seen
+
+
+def _subgraph(summary: dict, nodes: set, threshold: Optional[float] = None) -> dict:
+    return {'nodes': [n for n in summary['nodes'] if n[0] in nodes],
+            'links': [x for x in summary['links'] if x[0] in nodes and x[1] in nodes and
+                      (threshold is None or x[3] <= threshold)]}
+
+
+def _contract(summary: dict, group: Dict[int, int]) -> dict:
+    """
+    Merge complexes into groups. Complexes missing in group map are hidden. Hidden count includes sizes of nodes.
+    Links between the same groups are merged into one with the lowest TS energy and reaction id None.
+    """
+    nodes = {}
+    for c, e, _, size in summary['nodes']:
+        if c not in group:
+            continue
+        g = group[c]
+        if g in nodes:
+            node = nodes[g]
+            node[1] = min(node[1], e)
+            node[3] += size
+        else:
+            nodes[g] = [g, e, 0, size]
+
+    links = {}
+    for c, p, r, e, count in summary['links']:
+        if c not in group or p not in group:
+            continue
+        key = (group[c], group[p])
+        if key[0] == key[1]:
+            continue
+        if key in links:
+            link = links[key]
+            link[2] = None
+            link[3] = min(link[3], e)
+            link[4] += count
+        else:
+            links[key] = [*key, r, e, count]
+            nodes[key[0]][2] += 1
+            nodes[key[1]][2] += 1
+    return {'nodes': list(nodes.values()), 'links': list(links.values()),
+            'hidden': summary.get('hidden', 0) + sum(n[3] for n in summary['nodes'] if n[0] not in group)}
+
+
+def merge_components(first: int, second: int):
+    """
+    Update reachability index on connection of two complexes by reaction.
+
+    Complexes of the smaller component are relabeled into the bigger one.
+    Reactions stored in both directions, thus connected component is the set of mutually reachable complexes.
+    """
+    db.cypher_query('MATCH (a:Complex), (b:Complex) WHERE id(a) = $first AND id(b) = $second '
+                    'WITH a.component AS x, b.component AS y WHERE x <> y '
+                    'MATCH (c:Complex {component: x}) WITH x, y, count(c) AS nx '
+                    'MATCH (c:Complex {component: y}) WITH x, y, nx, count(c) AS ny '
+                    'WITH CASE WHEN nx < ny THEN x ELSE y END AS old, CASE WHEN nx < ny THEN y ELSE x END AS new '
+                    'MATCH (c:Complex {component: old}) SET c.component = new', {'first': first, 'second': second})
+
+
+def merge_components_bulk(pairs: Iterable[Tuple[int, int]]):
+    """
+    Update reachability index on connection of pairs of complexes by batch of reactions.
+
+    Components of complexes are united in memory. Each united component is labeled as its biggest part by single query.
+    Complexes without label are ignored as in `merge_components`.
+    """
+    pairs = list(pairs)
+    if not pairs:
+        return
+    rows, _ = db.cypher_query('MATCH (a:Complex) WHERE id(a) IN $ids AND a.component IS NOT NULL '
+                              'WITH a.component AS x, collect(id(a)) AS ids '
+                              'MATCH (c:Complex {component: x}) RETURN x, ids, count(c)',
+                              {'ids': list({x for pair in pairs for x in pair})})
+    labels = {}
+    sizes = {}
+    for x, ids, n in rows:
+        sizes[x] = n
+        labels.update(dict.fromkeys(ids, x))
+    parents = {x: x for x in sizes}
+
+    def find(x):
+        while parents[x] != x:
+            parents[x] = x = parents[parents[x]]
+        return x
+
+    for c, p in pairs:
+        if c not in labels or p not in labels:
+            continue
+        c, p = find(labels[c]), find(labels[p])
+        if c != p:
+            if (sizes[c], c) < (sizes[p], p):
+                c, p = p, c
+            parents[p] = c
+            sizes[c] += sizes[p]
+
+    rows = [[x, find(x)] for x in parents if parents[x] != x]
+    if rows:
+        db.cypher_query('UNWIND $rows AS row MATCH (c:Complex {component: row[0]}) SET c.component = row[1]',
+                        {'rows': rows})
+
+
+def rebuild_components(batch_size: int = 10000) -> int:
+    """
+    Rebuild reachability index of all complexes from the graph.
+
+    :param batch_size: number of complexes updated in one transaction
+    :return: number of connected components
+    """
+    parents = {c: c for c, in db.cypher_query('MATCH (c:Complex) RETURN id(c)')[0]}
+
+    def find(x):
+        while parents[x] != x:
+            parents[x] = x = parents[parents[x]]
+        return x
+
+    for c, p in db.cypher_query('MATCH (c:Complex)-[:C2R]->(:Reaction)<-[:R2C]-(p:Complex) RETURN id(c), id(p)')[0]:
+        c, p = find(c), find(p)
+        if c != p:
+            parents[max(c, p)] = min(c, p)
+
+    rows = [[c, find(c)] for c in parents]
+    for i in range(0, len(rows), batch_size):
+        db.cypher_query('UNWIND $rows AS row MATCH (c:Complex) WHERE id(c) = row[0] SET c.component = row[1]',
+                        {'rows': rows[i:i + batch_size]})
+    return len({c for _, c in rows})
+
+
+def molecules_connected(source: int, target: int) -> bool:
+    """
+    Check existence of path between complexes of molecules by reachability index in single query.
+    """
+    rows, _ = db.cypher_query('MATCH (m:Molecule)-[:M2C]->(c:Complex) WHERE id(m) IN [$source, $target] '
+                              'RETURN id(m), id(c), c.component', {'source': source, 'target': target})
+    sources = {c: x for m, c, x in rows if m == source}
+    targets = {c: x for m, c, x in rows if m == target}
+    return not {x for c, x in sources.items() if c not in targets}.isdisjoint(
+        x for c, x in targets.items() if c not in sources)
+
+
+def server_paths(sources: Iterable[int], targets: Iterable[int], max_len: int = 10,
+                 limit: Optional[int] = None) -> List[Tuple[List[int], List[float], List[float]]]:
+    """
+    Enumerate loopless paths between complexes sets by single variable-length Cypher query on the Neo4j side.
+
+    Paths never pass through sources and targets, shortest returned first.
+
+    :param max_len: path length limit in the same units as in `search_path`
+    :param limit: maximal number of paths
+    :return: nodes ids, nodes energies and relationships barriers lists. Complexes on even and reactions on odd
+        positions of nodes. C2R barriers on even and R2C barriers on odd positions of relationships.
+    """
+    sources = set(sources)
+    targets = set(targets) - sources
+    if not sources or not targets:
+        return []
+    # R2C relationships are directed from product complex to reaction. path is undirected with alternating types
+    query = ('MATCH p = (s:Complex)-[:C2R|R2C*2..%d]-(t:Complex) '
+             'WHERE id(s) IN $sources AND id(t) IN $targets '
+             'WITH p, nodes(p) AS n, relationships(p) AS e '
+             'WHERE ALL(i IN range(0, size(e) - 1) WHERE type(e[i]) = CASE i %% 2 WHEN 0 THEN "C2R" ELSE "R2C" END) '
+             'AND NONE(x IN n[1..-1] WHERE id(x) IN $sources OR id(x) IN $targets) '
+             'AND ALL(i IN range(0, size(n) - 2) WHERE NOT n[i] IN n[i + 1..]) '
+             'RETURN [x IN n | id(x)], [x IN n | x.energy], [x IN e | x.energy] ORDER BY length(p)'
+             ) % ((max_len + 1) // 2 * 2)
+    if limit is not None:
+        query += ' LIMIT %d' % limit
+    paths, _ = db.cypher_query(query, {'sources': list(sources), 'targets': list(targets)})
+    return paths
+
+
+__all__ = ['ReactionNetwork', 'BruttoNetwork', 'DatabaseNetwork', 'BatchNetwork', 'server_paths', 'merge_components',
+           'merge_components_bulk', 'rebuild_components', 'molecules_connected', 'network_summary', 'update_summaries',
+           'stale_summaries', 'coarsen_summary', 'network_view', 'label_propagation']
@@ -18,7 +18,7 @@
 #  along with this program; if not, see <https://www.gnu.org/licenses/>.
 #
 from CGRtools import XYZRead
-from CGRtools.containers import ReactionContainer
+from CGRtools.containers import MoleculeContainer, ReactionContainer
 from io import StringIO
 from typing import Iterator
 
@@ -36,15 +36,12 @@ def log_parser(file) -> Iterator[ReactionContainer]:
         raise ValueError
 
 
-def pt_parser(file):
+def _points(file) -> Iterator[tuple]:
     """
-        parser to work with specified file
+    Lazy reader of reaction path points. Only current point is kept in memory.
 
-    :return  tuple of 2 reaction containers. Each container consist of reactant(initaial state - mol container),
-        product(final state - mol container), reagent(transition state - mol container). Each of mol containers
-        should have {"energy":float} in meta dictionary.
+    :return: pairs of atoms list [(symbol, x, y, z), ...] and energy
     """
-    pts = []
     tmp = []
     flag = False
     for i in file:
@@ -55,34 +52,60 @@ def pt_parser(file):
             if "Item" in i:
                 continue
             if "ENERGY" in i:
-                structure = {}
-                structure["mol"] = tmp
-                structure["energy"] = float(i.split()[1])
-                structure['type'] = "TMP"
+                yield tmp, float(i.split()[1])
                 tmp = []
-                pts.append(structure)
                 flag = False
                 continue
             at, x, y, z = i.split()
             tmp.append((at, float(x), float(y), float(z)))
-    pts[0]["type"] = "EQ"
-    pts[-1]["type"] = "EQ"
-    if len(pts) < 3:
+
+
+def _molecule(mol, energy, _type):
+    mol = xyz(mol)
+    mol.meta['energy'] = energy
+    mol.meta['type'] = _type
+    return mol
+
+
+def profile_parser(file) -> Iterator[MoleculeContainer]:
+    """
+    Lazy parser of all points of reaction path for IRC profile analysis.
+    Check for header matching or raise error.
+
+    :return: iterator of mol containers with {"energy": float, "type": "TMP"} in meta dictionary.
+    """
+    line = next(file)
+    if not line.startswith("Update the reaction path"):
         raise ValueError
-    structure = sorted(pts, key=lambda x: x["energy"], reverse=True)[0]
-    if structure["type"] == "EQ":
+    return (_molecule(mol, energy, 'TMP') for mol, energy in _points(file))
+
+
+def pt_parser(file):
+    """
+        parser to work with specified file
+
+    Streaming parser: only the first, the last and the highest energy points are kept in memory.
+
+    :return  tuple of 2 reaction containers. Each container consist of reactant(initaial state - mol container),
+        product(final state - mol container), reagent(transition state - mol container). Each of mol containers
+        should have {"energy":float} in meta dictionary.
+    """
+    first = last = top = None
+    top_index = n = -1
+    for n, point in enumerate(_points(file)):
+        if first is None:
+            first = point
+        if top is None or point[1] > top[1]:  # the first of equal points
+            top = point
+            top_index = n
+        last = point
+    if n < 2:  # at least 3 points required
+        raise ValueError
+    if top_index in (0, n):
         raise ValueError
-    structure["type"] = "TS"
-    mol1 = xyz(pts[0]['mol'])
-    mol1.meta['energy'] = pts[0]['energy']
-    mol1.meta['type'] = pts[0]['type']
-    mol2 = xyz(pts[-1]['mol'])
-    mol2.meta['energy'] = pts[-1]['energy']
-    mol2.meta['type'] = pts[-1]['type']
-    ts = xyz(structure['mol'])
-    ts.meta['energy'] = structure['energy']
-    ts.meta['type'] = structure['type']
+    mol1 = _molecule(*first, 'EQ')
+    mol2 = _molecule(*last, 'EQ')
+    ts = _molecule(*top, 'TS')
     a = ReactionContainer(reagents=[ts], reactants=[mol1], products=[mol2])
     b = ReactionContainer(reagents=[ts], reactants=[mol2], products=[mol1])
     return a, b
-
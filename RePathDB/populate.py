@@ -17,9 +17,19 @@
 #  You should have received a copy of the GNU Lesser General Public License
 #  along with this program; if not, see <https://www.gnu.org/licenses/>.
 #
-from os import listdir
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from hashlib import sha256
+from io import BytesIO, TextIOWrapper
+from os import listdir, stat
 from os.path import join
+from .bulk import BulkLoader, prepare
+from .cache import ingestion_session
+from .dedup import config as dedup_config, unindexed_states
+from .energy import recompute_changed
 from .graph import Reaction
+from .network import update_summaries
 from .parser import log_parser
 from dash_html_components import Div
 import codecs
@@ -35,17 +45,129 @@ def load_data(files, suffix, log_parser=log_parser ):
     please see parser part for the example
     updates databases
     """
-    for f in sorted(listdir(files)):
-        if not f.endswith(suffix):
-            continue
+    with ingestion_session():
+        for f in sorted(listdir(files)):
+            if not f.endswith(suffix):
+                continue
+            try:
+                forward, backward = log_parser(open(join(files, f)))
+            except ValueError:
+                print(f'invalid: {f}')
+                continue
+            Reaction(forward)
+            Reaction(backward)
+            print(f'processed: {f}')
+        print(f'recomputed barriers: {recompute_changed()}')
+    print(f'updated network summaries: {update_summaries()}')
+
+
+def parse_file(file, log_parser=log_parser):
+    """
+    Parse log file and prepare reactions for bulk loading. Runs in worker process.
+
+    :return: file name, size, mtime, content hash and prepared reactions or None for invalid file
+    """
+    st = stat(file)
+    h = sha256()
+    with open(file, 'rb') as f:
+        for chunk in iter(partial(f.read, 1 << 20), b''):
+            h.update(chunk)
+    try:
+        with open(file) as f:
+            records = [prepare(r) for r in log_parser(f)]
+    except ValueError:
+        records = None
+    return file, st.st_size, st.st_mtime, h.hexdigest(), records
+
+
+def parse_log(item, log_parser=log_parser):
+    """
+    Parse content of log file and prepare reactions for bulk loading. Runs in worker process.
+
+    :param item: file name and content
+    :return: file name and prepared reactions or None for invalid file
+    """
+    name, data = item
+    try:
+        with TextIOWrapper(BytesIO(data), encoding='utf-8') as f:
+            records = [prepare(r) for r in log_parser(f)]
+    except ValueError:  # including decoding errors
+        records = None
+    return name, records
+
+
+def load_data_bulk(files, suffix, workers=1, batch_size=100, log_parser=log_parser, rmsd=None):
+    """
+    method for console data upload with parallel parsing and batched database writes.
+    loaded files are stored in manifest. unchanged files are skipped without opening,
+    files with already loaded content are marked as duplicates. interrupted loading can be restarted.
+    :param files: path to directory
+    :param suffix: file types to process
+    :param workers: number of parsing processes
+    :param batch_size: number of files written in one transaction
+    :param log_parser: method for parsing files. see load_data
+    :param rmsd: RMSD threshold in angstroms for merging of near-duplicate ES and TS. None disables
+    :return: counts of processed, duplicate, invalid, failed and unchanged files
+    """
+    files = [join(files, f) for f in sorted(listdir(files)) if f.endswith(suffix)]
+    loader = BulkLoader(rmsd)
+    parse = partial(parse_file, log_parser=log_parser)
+    report = Counter()
+
+    if rmsd is not None:
+        unindexed = unindexed_states()
+        if any(unindexed.values()):
+            print('warning: {EquilibriumState} ES and {TransitionState} TS populated by older versions are not '
+                  'searched for near-duplicates. run migrate to index ES'.format_map(unindexed))
+
+    known = loader.manifest(files)
+    new = []
+    for f in files:
+        if f in known:
+            st = stat(f)
+            size, mtime, _, status = known[f]
+            if size == st.st_size and mtime == st.st_mtime and status not in (None, 'failed'):
+                report['unchanged'] += 1
+                continue
+        new.append(f)
+
+    def write(batch, manifest):
         try:
-            forward, backward = log_parser(open(join(files, f)))
-        except ValueError:
-            print(f'invalid: {f}')
-            continue
-        Reaction(forward)
-        Reaction(backward)
-        print(f'processed: {f}')
+            status = loader.write(batch, manifest)
+        except Exception as e:  # batch transaction rolled back. load files one by one
+            print(f'batch failed: {e}')
+            status = loader.write_each(batch)
+            loader.update_manifest(manifest, status)
+        for f, (s, _) in status.items():
+            print(f'{s}: {f}')
+            report[s] += 1
+
+    executor = ProcessPoolExecutor(workers) if workers > 1 else None
+    loader.executor = executor  # 2D cleaning of new molecules
+    with ingestion_session():
+        dedup_config.rmsd = rmsd  # for sequential loading of failed batches
+        try:
+            batch = []
+            manifest = {}
+            for f, size, mtime, h, records in (executor.map(parse, new, chunksize=max(1, batch_size // workers))
+                                               if executor else map(parse, new)):
+                batch.append((f, records))
+                manifest[f] = (size, mtime, h)
+                if len(batch) == batch_size:
+                    write(batch, manifest)
+                    batch = []
+                    manifest = {}
+            if batch:
+                write(batch, manifest)
+            print(f'recomputed barriers: {recompute_changed()}')
+        finally:
+            dedup_config.rmsd = None
+            if executor:
+                executor.shutdown()
+    print(f'updated network summaries: {update_summaries()}')
+    print('processed: {processed}, duplicate: {duplicate}, invalid: {invalid}, failed: {failed}, '
+          'unchanged: {unchanged}'.format_map(report))
+    return report
 
 
 def load_one_file(file):
@@ -90,4 +212,4 @@ def load_data_remotely(files):  # old method for dash upload
     return divs
 
 
-__all__ = ['load_data']
+__all__ = ['load_data', 'load_data_bulk']
@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2021 Ramil Nugmanov <nougmanoff@protonmail.com>
+#  Copyright 2021 Timur Gimadiev <timur.gimadiev@gmail.com>
+#  This file is part of RePathDB.
+#
+#  RePathDB is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, see <https://www.gnu.org/licenses/>.
+#
+"""
+Path search algorithms over reaction networks.
+
+Network is any object with `successors(complex_id)` method returning (reaction id, barrier, product id) triples,
+e.g. ReactionNetwork snapshot or DatabaseNetwork. Paths are lists of (node id, barrier) pairs with complexes
+on even and reactions on odd positions, as yielded by `Complex.search_path`.
+"""
+from heapq import heappush, heappop, heapreplace
+from itertools import count
+from math import inf
+from operator import add
+from typing import Iterable, Iterator, List, Tuple
+
+
+costs = {'total': add, 'barrier': max}
+
+
+def max_steps(max_len: int) -> int:
+    """
+    Maximal number of reactions in path yielded by breadth-first `search_path` with given `max_len`.
+    """
+    return (max_len + 1) // 2
+
+
+def breadth_first_paths(network, sources: Iterable[int], targets: Iterable[int],
+                        max_len: int = 10) -> Iterator[List[Tuple[int, float]]]:
+    """
+    Level-synchronous breadth-first search of paths between complexes sets. Yields the same paths in the same
+    order as `Complex.search_path`.
+
+    If network has `prefetch(complexes_ids)` method, it is called with all complexes of the level before expansion.
+    """
+    return _breadth_first(network, sources, targets, max_len)
+
+
+def _breadth_first(network, sources, targets, max_len, backward=None):
+    """
+    Breadth-first search optionally pruned by lower bounds of distances to targets from backward search.
+    Pruned complexes are marked as seen as in unpruned search, thus the rest of paths and their order are kept.
+    """
+    seen = set(sources)
+    final_compl = set(targets)
+    cur_compl = seen - final_compl
+    final_compl -= seen
+    if not final_compl:
+        return
+    prefetch = getattr(network, 'prefetch', None)
+    limit = max_steps(max_len)
+    level = [[(x, 0)] for x in sorted(cur_compl)]
+    n = count()
+    while level:
+        complexes = {path[-1][0] for path in level}
+        if prefetch is not None:
+            prefetch(complexes)
+        depth = len(level[0]) // 2 + 1  # number of reactions in paths of the next level
+        if backward is not None:  # smaller frontier first
+            while backward.frontier and depth + backward.depth < limit and len(backward.frontier) < len(complexes):
+                backward.expand()
+        cur_len = len(level[0]) + 1 < max_len
+        new_level = []
+        new_seen = set()
+        for init_path in level:
+            for r, barrier, prod in network.successors(init_path[-1][0]):
+                if prod in final_compl:
+                    path = init_path.copy()
+                    path.append((r, barrier))
+                    path.append((prod, barrier))
+                    yield path
+                elif cur_len and prod not in seen:
+                    new_seen.add(prod)
+                    if backward is not None and depth + backward.bound(prod) > limit:
+                        continue  # targets are too far
+                    path = init_path.copy()
+                    path.append((r, barrier))
+                    path.append((prod, barrier))
+                    new_level.append((barrier, next(n), path))
+        seen.update(new_seen)
+        new_level.sort()
+        level = [path for *_, path in new_level]
+
+
+def _endpoints(sources, targets):
+    """
+    Prepare sources and targets as in breadth-first search: complexes common for both sets are neither
+    start nor end of path. Paths never pass through any of initial sources.
+
+    :return: start complexes, end complexes and banned for passing complexes
+    """
+    banned = set(sources)
+    targets = set(targets)
+    return banned - targets, targets - banned, banned
+
+
+def _spur(network, start, start_cost, start_steps, targets, banned_nodes, banned_edges, limit, combine):
+    """
+    Dijkstra search from start complex to any of targets with limited number of steps.
+
+    Labels dominated by already settled label of the same complex with less or equal steps are skipped.
+    """
+    n = count()
+    queue = [(start_cost, start_steps, next(n), start, None)]
+    settled = {}
+    while queue:
+        cost, steps, _, cur, chain = heappop(queue)
+        if cur in targets:
+            path = []
+            while chain is not None:
+                chain, r, b, c = chain
+                path.append((c, b))
+                path.append((r, b))
+            path.reverse()
+            return cost, path
+        if settled.get(cur, limit + 1) <= steps:
+            continue
+        settled[cur] = steps
+        if steps == limit:
+            continue
+        for r, b, p in network.successors(cur):
+            if p in banned_nodes or (cur, r) in banned_edges or settled.get(p, limit + 1) <= steps + 1:
+                continue
+            heappush(queue, (combine(cost, b), steps + 1, next(n), p, (chain, r, b, p)))
+
+
+def k_shortest_paths(network, sources: Iterable[int], targets: Iterable[int], k: int = 10, max_len: int = 10,
+                     cost: str = 'total') -> Iterator[Tuple[float, List[Tuple[int, float]]]]:
+    """
+    Yen's k-shortest loopless paths between complexes sets ranked by barriers.
+
+    Like breadth-first search, paths never pass through sources and end at the first reached target.
+    Barriers should be non-negative, which is true for barriers calculated from the lowest ES of complexes.
+    Candidates are generated lazily, thus consumer can stop iteration as soon as enough paths found.
+
+    :param k: number of paths to find
+    :param max_len: path length limit in the same units as in `search_path`
+    :param cost: 'total' - sum of barriers, 'barrier' - highest barrier of path (rate-limiting step)
+    :return: pairs of path cost and path in cost order
+    """
+    combine = costs[cost]
+    sources, targets, banned = _endpoints(sources, targets)
+    if not sources or not targets or k <= 0:
+        return
+    limit = max_steps(max_len)
+
+    found = []
+    candidates = []  # heap of not yet accepted paths
+    known = set()  # node ids of all paths ever pushed into candidates
+    n = count()
+    for s in sorted(sources):  # best path of each source. equivalent to spur from virtual root of all sources
+        spur = _spur(network, s, 0, 0, targets, banned, (), limit, combine)
+        if spur is not None:
+            c, p = spur
+            p.insert(0, (s, 0))
+            heappush(candidates, (c, next(n), p))
+            known.add(tuple(x for x, _ in p))
+
+    while candidates and len(found) < k:
+        c, _, path = heappop(candidates)
+        found.append(path)
+        yield c, path
+
+        # spur from each complex of the last found path except the target
+        root_cost = 0
+        for i in range(0, len(path) - 1, 2):
+            root = path[:i + 1]
+            spur_node = path[i][0]
+            banned_edges = {(p[i][0], p[i + 1][0]) for p in found if len(p) > i + 1 and p[:i + 1] == root}
+            banned_nodes = banned | {x for x, _ in root[:-1:2]}
+            spur = _spur(network, spur_node, root_cost, i // 2, targets, banned_nodes, banned_edges, limit, combine)
+            if spur is not None:
+                sc, sp = spur
+                total = root + sp
+                key = tuple(x for x, _ in total)
+                if key not in known:
+                    known.add(key)
+                    heappush(candidates, (sc, next(n), total))
+            root_cost = combine(root_cost, path[i + 1][1])
+
+
+def bottleneck_paths(network, sources: Iterable[int], targets: Iterable[int], k: int = 10,
+                     max_len: int = 10) -> Iterator[Tuple[float, List[Tuple[int, float]]]]:
+    """
+    Minimax search of k loopless paths with the lowest rate-limiting barrier.
+
+    Partial paths are expanded in order of running max barrier. Found paths are yielded in order of their
+    highest barrier, ties resolved by length. Partial paths which running max barrier already exceeds barrier of
+    k-th best found path are pruned and never expanded, thus successors of kinetically irrelevant complexes are
+    not requested from network.
+
+    :param k: number of paths to find
+    :param max_len: path length limit in the same units as in `search_path`
+    :return: pairs of path highest barrier and path
+    """
+    sources, targets, banned = _endpoints(sources, targets)
+    if not sources or not targets or k <= 0:
+        return
+    limit = max_steps(max_len)
+
+    n = count()
+    queue = [(0, 0, next(n), False, [(x, 0)]) for x in sorted(sources)]
+    best = []  # max-heap of barriers of k best complete paths
+    found = 0
+    while queue:
+        barrier, steps, _, final, path = heappop(queue)
+        if final:
+            yield barrier, path
+            found += 1
+            if found == k:
+                return
+            continue
+        if steps == limit:
+            continue
+        visited = {x for x, _ in path[::2]}
+        for r, b, p in network.successors(path[-1][0]):
+            if p in banned or p in visited:
+                continue
+            bound = b if b > barrier else barrier
+            if len(best) == k and bound > -best[0]:  # pruned
+                continue
+            new = path.copy()
+            new.append((r, b))
+            new.append((p, b))
+            if p in targets:
+                heappush(queue, (bound, steps + 1, next(n), True, new))
+                if len(best) < k:
+                    heappush(best, -bound)
+                elif bound < -best[0]:
+                    heapreplace(best, -bound)
+            else:
+                heappush(queue, (bound, steps + 1, next(n), False, new))
+
+
+class _Backward:
+    """
+    Backward breadth-first search from targets over incoming reactions.
+    Paths never pass through sources and targets, thus they are not expanded.
+    """
+    def __init__(self, network, sources, targets):
+        self.predecessors = network.predecessors
+        self.banned = set(sources)
+        self.distance = dict.fromkeys(targets, 0)
+        self.frontier = list(self.distance)
+        self.depth = 0
+
+    def expand(self):
+        self.depth += 1
+        frontier = []
+        for cur in self.frontier:
+            for _, _, c in self.predecessors(cur):
+                if c not in self.distance and c not in self.banned:
+                    self.distance[c] = self.depth
+                    frontier.append(c)
+        self.frontier = frontier
+
+    def bound(self, complex_: int) -> float:
+        """
+        Lower bound of number of reactions from complex to targets.
+        """
+        try:
+            return self.distance[complex_]
+        except KeyError:
+            return self.depth + 1 if self.frontier else inf
+
+
+def bidirectional_paths(network, sources: Iterable[int], targets: Iterable[int],
+                        max_len: int = 10) -> Iterator[List[Tuple[int, float]]]:
+    """
+    Bidirectional breadth-first search of paths between complexes sets.
+
+    Network should also have `predecessors(complex_id)` method returning (reaction id, barrier, reactant id) triples.
+    Backward search from targets and forward search from sources are expanded level by level, the smaller frontier
+    first. Forward search skips complexes which distance to targets found by backward search exceeds the rest of
+    length limit. Yields the same paths in the same order as `breadth_first_paths`.
+    """
+    sources = set(sources)
+    targets = set(targets)
+    return _breadth_first(network, sources, targets, max_len, _Backward(network, sources, targets - sources))
+
+
+__all__ = ['breadth_first_paths', 'k_shortest_paths', 'bottleneck_paths', 'bidirectional_paths']
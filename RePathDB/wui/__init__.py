@@ -17,42 +17,43 @@
 #  You should have received a copy of the GNU Lesser General Public License
 #  along with this program; if not, see <https://www.gnu.org/licenses/>.
 #
-from base64 import encodebytes,b64encode
+from base64 import b64encode
 from CGRdb import Molecule as pMolecule
 from CGRtools import MoleculeContainer, MRVRead
 from dash import Dash, callback_context
 from dash.dependencies import Input, Output, State
-from dash_html_components import Div
-from ..graph import Molecule, Complex
+from dash_uploader import configure_upload
+from dash_html_components import Div, Li, Ul
+from ..graph import Molecule, Complex, structure_cache
 from itertools import product
 from io import BytesIO
-from .layout import get_layout, reactant_color, product_color, reaction_color, molecule_color, UPLOAD_FOLDER_ROOT
-from os import getenv, remove
+from .layout import (get_layout, reactant_color, product_color, reaction_color, molecule_color, kcal,
+                     UPLOAD_FOLDER_ROOT)
+from os import getenv
 from pony.orm import db_session
 from .plugins import external_scripts, external_stylesheets
 from plotly.graph_objects import Figure
 from pathlib import Path
-from ..populate import load_one_file
-from .utilities import get_figure, get_3d, draw, get_mrv, cleanDB
+from ..depiction import DepictionCache
+from ..jobs import JobQueue
+from ..network import network_view
+from .utilities import get_profile, draw, get_mrv, cleanDB
 
-from flask import make_response
-
-import zipfile
-from collections import Counter
+from flask import make_response, abort, jsonify
 
 MoleculeContainer._render_config['mapping'] = False
 color_map = ['rgb(0,104,55)', 'rgb(26,152,80)', 'rgb(102,189,99)', 'rgb(166,217,106)', 'rgb(217,239,139)',
              'rgb(254,224,139)']
 
 
-def svg2html(svg):
-    return 'data:image/svg+xml;base64,' + encodebytes(svg.encode()).decode().replace('\n', '')
-
-
 dash = Dash(__name__, external_stylesheets=external_stylesheets, external_scripts=external_scripts)
 dash.title = 'RePathDB'
-dash.layout = get_layout(dash)
+configure_upload(dash, UPLOAD_FOLDER_ROOT, upload_api="/API/dash-upload", )
+dash.layout = get_layout(dash)  # rebuilt for configured suffix of uploaded log files. see set_suffix
 dash.server.secret_key = getenv('SECRET_KEY', 'development')
+depictions = DepictionCache()
+jobs = JobQueue()
+max_network_nodes = int(getenv('REPATHDB_NETWORK_NODES', 300))  # bigger networks are summarized
 
 
 @dash.callback([Output('editor', 'upload'), Output('table', 'data')], [Input('editor', 'download')])
@@ -79,7 +80,7 @@ def search(mrv):
                         m.structure.implicify_hydrogens()
                     for i, j in product((Molecule.nodes.get(cgrdb=m.id) for m in m1),
                                         (Molecule.nodes.get(cgrdb=m.id) for m in m2)):
-                        if i.has_path(j):
+                        if i.has_path(j, max_len=None):  # answered by reachability index
                             tmp.append({'reactant': i.id, 'product': j.id,
                                         'reactant_structure': str(i.structure), 'product_structure': str(j.structure)})
             if tmp:
@@ -99,9 +100,8 @@ def graph(row_id, table):
     row = table[row_id[0]]
     m1 = Molecule.get(row['reactant'])
     m2 = Molecule.get(row['product'])
-    with db_session:
-        s1 = svg2html(m1.depict())
-        s2 = svg2html(m2.depict())
+    s1 = depictions.url(m1)
+    s2 = depictions.url(m2)
     max_path = 10
     # max_path_graph = max_path +1 # mols were not included
     paths = m1.get_effective_paths(m2, max_path)
@@ -120,13 +120,13 @@ def graph(row_id, table):
                 Output('net', 'data'), Output('structure', 'value'), Output('net_img', 'src'),
                 Output('table3', 'data')],
                [Input('table2', 'selected_rows'), Input('paths-graph', 'clickData'), Input('net', 'selectedId'),
-                Input('table3', 'selected_rows')],
+                Input('table3', 'selected_rows'), Input('net_view', 'data')],
                [State('table2', 'data'), State('paths-graph', 'figure'), State('reagent_img2', 'src'),
                 State('product_img2', 'src'), State('net', 'data'), State('structure', 'value'),
                 State('net_img', 'src'),
                 State('table3', 'data')])
-def graph(row_id2_inp, path_graph_click, netid, table3_row, table2, path_graph_data, reagent_img2, product_img2,
-          net_data,
+def graph(row_id2_inp, path_graph_click, netid, table3_row, net_view, table2, path_graph_data, reagent_img2,
+          product_img2, net_data,
           struct_d3, net_img, table3_data):
     ctx = callback_context
     element_id = ctx.triggered[0]['prop_id'].split('.')[0]
@@ -139,64 +139,31 @@ def graph(row_id2_inp, path_graph_click, netid, table3_row, table2, path_graph_d
         m1 = Complex.get(row['reactant'])
         m2 = Complex.get(row['product'])
         b1 = m1.brutto.all()[0]
-        b2 = m2.brutto.all()[0]
-        if b1 == b2:
-            graph_nodes = [{'id': str(x.id), 'color': "grey"} for x in b1.complexes.all()]
-            graph_links = [{'source': r.reactant.all()[0].id, 'target': r.product.all()[0].id, 'color': "green"} for r
-                           in b1.reactions.all()]
-            net_data = {'nodes': graph_nodes, 'links': graph_links}
-        else:
-            pass
-        with db_session:
-            s1 = svg2html(m1.depict())
-            s2 = svg2html(m2.depict())
-            reagent_img2 = s1
-            product_img2 = s2
+        reagent_img2 = depictions.url(m1)
+        product_img2 = depictions.url(m2)
         max_path = 10
         # max_path_graph = max_path +1 # mols were not included
         paths = m1.get_effective_paths(m2, max_path)
-        # print(paths)
         table3_data = []
         longest = max(len(path.nodes) for path in paths)
-        for path in sorted(paths, key=lambda x: (((len(x.nodes) - 1) / 2), x.total_cost)):  # дальше тихий ужас. но пока лень переписывать
-            #paths = [paths]
-            zero_en = path.nodes[0].energy
-            #longest = max(len(path.nodes))# for x in paths)
-            nodes = {m1.id: (0, 0, reactant_color, "Complex " + str(m1.id)), m2.id: (
-                longest * 5, (path.nodes[-1].energy - zero_en) * 627.51, product_color, "Complex " + str(m2.id))}
-            edges = []
-            print(path)
-            d = {}
-            d["brutto"] = str(b1)
-            d["energy"] = round(path.total_cost * 627.51, 2)
-            # nodes[path.nodes[0].id] = (1 * max_path_graph, 0,  molecule_color, True)
-            for n, (x, c) in enumerate(zip(path.nodes, path.cost), start=1):
-                if x.id not in nodes:
-                    nodes[x.id] = (
-                    n * 5, (x.energy - zero_en) * 627.51 if n % 2 else (x.energy - zero_en + c) * 627.51,
-                    molecule_color if n % 2 else reaction_color,
-                    "Complex " + str(x.id) if n % 2 else "Reaction")
-            # edges.append(nodes[m1.id][:2])
-            d["len"] = (len(nodes) - 1) / 2
-            for n in path.nodes:
-                edges.append(nodes[n.id][:2])
-            # edges.append(nodes[m2.id][:2])
-            edges.append((None, None))
-            d["nodes"] = nodes
-            d["path_graph_data"] = get_figure(edges, nodes)
-            table3_data.append(d)
-        # print(table3_data)
+        for path in sorted(paths, key=lambda x: (((len(x.nodes) - 1) / 2), x.total_cost)):
+            # compact descriptor of path. profile figure is built on selection
+            table3_data.append({'brutto': str(b1), 'energy': round(path.total_cost * kcal, 2),
+                                'len': (len(path.nodes) - 1) / 2, 'path': [x.id for x in path.nodes],
+                                'energies': [x.energy for x in path.nodes], 'longest': longest})
         return reagent_img2, product_img2, path_graph_data, net_data, struct_d3, net_img, table3_data
 
     elif element_id == 'table3' and table3_row:
         row = table3_data[table3_row[0]]
-        nodes = row["nodes"]
-        print(nodes)
+        path = row['path']
+        colors = {str(x): molecule_color for x in path[2:-1:2]}
+        colors[str(path[0])] = reactant_color
+        colors[str(path[-1])] = product_color
         for i in net_data['nodes']:
             i['radius'] = 10
-            if i['id'] in nodes:
-                i['color'] = nodes[i['id']][2]
-        path_graph_data = row["path_graph_data"]
+            if i['id'] in colors:
+                i['color'] = colors[i['id']]
+        path_graph_data = get_profile(path, row['energies'], row['longest'])
         return reagent_img2, product_img2, path_graph_data, net_data, struct_d3, net_img, table3_data
 
     elif element_id == 'paths-graph' and path_graph_click:
@@ -218,22 +185,30 @@ def graph(row_id2_inp, path_graph_click, netid, table3_row, table2, path_graph_d
             i['radius'] = 10
             if i['id'] == str(id_c):
                 i['radius'] = 20
-                with db_session:
-                    m = Complex.get(int(id_c))
-                    if m is not None:
-                        net_img = svg2html(m.depict())
+                m = Complex.get(int(id_c))
+                if m is not None:
+                    net_img = depictions.url(m)
+
+        return reagent_img2, product_img2, path_graph_data, net_data, struct_d3, net_img, table3_data
 
+    elif element_id == 'net_view':
+        net_data = {'nodes': [], 'links': []}
+        if net_view:
+            window = net_view['window']
+            view = network_view(net_view['brutto'], max_network_nodes, net_view['focus'], net_view['hops'],
+                                window / kcal if window is not None else None, net_view['communities'])
+            net_data['nodes'] = [{'id': str(c), 'color': "grey" if size == 1 else "black",
+                                  'radius': 10 if size == 1 else 15} for c, _, _, size in view['nodes']]
+            net_data['links'] = [{'source': str(c), 'target': str(p), 'color': "green"} for c, p, *_ in view['links']]
         return reagent_img2, product_img2, path_graph_data, net_data, struct_d3, net_img, table3_data
 
     elif element_id == 'net' and netid is not None:
         # print(net_data)
         for i in net_data['nodes']:
             i['radius'] = 10
-            if i['id'] == netid:
+            if i['id'] == netid and int(netid) >= 0:  # negative ids are communities
                 i['radius'] = 20
-                with db_session:
-                    m = Complex.get(int(netid))
-                    net_img = svg2html(m.depict())
+                net_img = depictions.url(Complex.get(int(netid)))
         return reagent_img2, product_img2, path_graph_data, net_data, struct_d3, net_img, table3_data
 
     elif element_id == 'net' and netid is None:
@@ -251,38 +226,93 @@ def graph(row_id2_inp, path_graph_click, netid, table3_row, table2, path_graph_d
         return reagent_img2, product_img2, path_graph_data, net_data, struct_d3, net_img, table3_data
 
 
-@dash.callback(Output('file_upload-output', 'children'),
+@dash.callback(Output('net_view', 'data'),
+               [Input('table2', 'selected_rows'), Input('net', 'selectedId'), Input('net_window', 'value'),
+                Input('net_hops', 'value'), Input('net_back', 'n_clicks')],
+               [State('table2', 'data'), State('net_view', 'data')])
+def navigate_network(row_id2_inp, netid, window, hops, back, table2, net_view):
+    """
+    Parameters of Brutto network view. Community nodes are expanded on click.
+    """
+    element_id = callback_context.triggered[0]['prop_id'].split('.')[0]
+    if element_id == 'table2':
+        if not row_id2_inp:
+            return None
+        row = table2[row_id2_inp[0]]
+        m1 = Complex.get(row['reactant'])
+        m2 = Complex.get(row['product'])
+        b1 = m1.brutto.all()[0]
+        if b1 != m2.brutto.all()[0]:
+            return None
+        return {'brutto': b1.id, 'focus': [m1.id, m2.id], 'communities': [], 'window': window, 'hops': hops}
+    if not net_view:
+        return None
+    if element_id == 'net':
+        if netid is None or int(netid) >= 0:
+            return net_view
+        net_view['communities'].append(int(netid))
+    elif element_id == 'net_back':
+        net_view['communities'] = net_view['communities'][:-1]
+    else:
+        net_view.update(window=window, hops=hops, communities=[])
+    return net_view
+
+
+@dash.callback(Output('upload_job', 'data'),
                [Input('file_upload', 'isCompleted')],
                [State('file_upload', 'fileNames'),
                 State('file_upload', 'upload_id')], )
 def get_files(iscompleted, filenames, upload_id):
-    ctx = callback_context
-    element_id = ctx.triggered[0]['prop_id'].split('.')[0]
-    print(element_id)
-    if not iscompleted:
-        return
-
-    if filenames is not None:
-        if upload_id:
-            root_folder = Path(UPLOAD_FOLDER_ROOT) / upload_id
-        else:
-            root_folder = Path(UPLOAD_FOLDER_ROOT)
-        counter = Counter()
-        for filename in filenames:
-            file = root_folder / filename
-            archive = zipfile.ZipFile(file, 'r')
-            for one in archive.namelist()[1:]:
-                print(one)
-                with archive.open(one) as file_open:
-                    counter[load_one_file(file_open)] += 1
-            remove(file)
-            print("{} removed".format(file))
-        return Div([
-            '{} log files were processed and added to database, {} files were not processed due to errors,'
-            ' not log files are omitted and were not taken into account'.format(counter["good"], counter["bad"])
-        ])
-
-    return Div("No Files Uploaded Yet!")
+    if not iscompleted or filenames is None:
+        return None
+
+    if upload_id:
+        root_folder = Path(UPLOAD_FOLDER_ROOT) / upload_id
+    else:
+        root_folder = Path(UPLOAD_FOLDER_ROOT)
+    return jobs.submit(root_folder / filename for filename in filenames)
+
+
+@dash.callback([Output('file_upload-output', 'children'), Output('upload_poll', 'disabled'),
+                Output('upload_cancel', 'disabled')],
+               [Input('upload_job', 'data'), Input('upload_poll', 'n_intervals'), Input('upload_cancel', 'n_clicks')])
+def upload_progress(job_id, _, cancel):
+    if not job_id:
+        return Div("No Files Uploaded Yet!"), True, True
+    if cancel and callback_context.triggered[0]['prop_id'] == 'upload_cancel.n_clicks':
+        jobs.cancel(job_id)
+    report = jobs.status(job_id)
+    if report is None:
+        return Div('Upload job not found'), True, True
+    counts = report['counts']
+    running = report['state'] in ('queued', 'running')
+    summary = Div(f"{report['state']}: {report['done']} of {report['total']} log files. "
+                  f"{counts.get('processed', 0)} files were processed and added to database, "
+                  f"{counts.get('invalid', 0) + counts.get('failed', 0)} files were not processed due to errors, "
+                  f"{counts.get('cancelled', 0)} files were cancelled" +
+                  (f". error: {report['error']}" if report['error'] else ''))
+    failed = [Li(f'{name}: {status}') for name, status in report['files'] if status in ('invalid', 'failed')]
+    return Div([summary, Ul(failed)] if failed else [summary]), not running, not running
+
+
+@dash.server.route('/upload/<job_id>')
+def get_upload_status(job_id):
+    report = jobs.status(job_id)
+    if report is None:
+        abort(404)
+    return jsonify(report)
+
+
+@dash.server.route('/upload/<job_id>/cancel', methods=['POST'])
+def cancel_upload_job(job_id):
+    if not jobs.cancel(job_id):
+        abort(404)
+    return jsonify(jobs.status(job_id))
+
+
+@dash.server.route('/cache')
+def get_cache_stats():
+    return jsonify({'structures': structure_cache.stats})
 
 
 @dash.server.route('/pictures/<name>')
@@ -296,4 +326,26 @@ def get_picture(name):
         return resp
 
 
-__all__ = ['dash']
+@dash.server.route('/depiction/<kind>/<int:_id>/<signature>.svg')
+def get_depiction(kind, _id, signature):
+    if kind not in ('molecule', 'complex', 'reaction'):
+        abort(404)
+    svg = depictions.load(kind, _id, signature)
+    if svg is None:
+        abort(404)
+    resp = make_response(svg)
+    resp.headers['Content-Type'] = 'image/svg+xml'
+    resp.headers['Cache-Control'] = 'public, max-age=31536000, immutable'  # signature is part of URL
+    resp.headers['ETag'] = signature
+    return resp
+
+
+def set_suffix(suffix: str):
+    """
+    Set the log-file extension of uploaded files. Upload widget accepts it together with archives.
+    """
+    jobs.suffix = suffix
+    dash.layout = get_layout(dash, suffix)
+
+
+__all__ = ['dash', 'jobs', 'set_suffix']
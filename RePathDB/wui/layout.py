@@ -17,10 +17,10 @@
 #  You should have received a copy of the GNU Lesser General Public License
 #  along with this program; if not, see <https://www.gnu.org/licenses/>.
 #
-from dash_core_components import Markdown, Graph, Loading
-from dash_uploader import Upload, configure_upload
+from dash_core_components import Markdown, Graph, Loading, Interval, Store, Input
+from dash_uploader import Upload
 import uuid
-from dash_html_components import Div, H1, Hr, Img, H2
+from dash_html_components import Div, H1, Hr, Img, H2, Button
 from dash_marvinjs import DashMarvinJS
 from dash_table import DataTable
 from mol3d_dash import Mol3dDash
@@ -31,6 +31,7 @@ reactant_color = '#8fbff2'
 product_color = '#fcca95'
 molecule_color = 'blue'
 reaction_color = 'red'
+kcal = 627.51  # hartree to kcal/mol. energies are stored in hartree
 
 readme = '''
 # Instructions
@@ -99,16 +100,21 @@ Clicking on any node will show the 2D structure of related complex.
 '''
 
 UPLOAD_FOLDER_ROOT = "/tmp/"
+archive_types = ['zip', 'tar', 'gz', 'tgz', 'bz2', 'xz']  # streamed by upload jobs. see iter_members
 
 
-def get_layout(app):
-    configure_upload(app, UPLOAD_FOLDER_ROOT, upload_api="/API/dash-upload", )
-
+def get_layout(app, suffix='.log'):
+    """
+    :param suffix: the log-file extension of uploaded files. accepted by upload widget together with archives
+    """
     row_0 = Div([H2("Upload to Database (log files)", style={'textAlign': 'left'}),
                  Div([Upload(id="file_upload", text='Drag and Drop files here', text_completed='''Download completed\n
                                               Started parsing file: ''', cancel_button=True, max_file_size=1800,  # 1800 Mb
-                             filetypes=['zip'], upload_id=uuid.uuid1(),  # Unique session id
-                             ), Loading(id='file_upload-output', children=[])])])
+                             filetypes=[*archive_types, suffix.rsplit('.', 1)[-1]],
+                             upload_id=uuid.uuid1(),  # Unique session id
+                             ), Loading(id='file_upload-output', children=[]),
+                      Button('Cancel processing', id='upload_cancel', disabled=True),
+                      Store(id='upload_job'), Interval(id='upload_poll', interval=2000, disabled=True)])])
     row_1 = Div([Div([DashMarvinJS(id='editor', marvin_url=app.get_asset_url('mjs/editor.html'), marvin_width='100%')],
                      className='col-md-6'),
                  Div([Markdown(readme)], style={"maxHeight": "400px", "overflow": "scroll"}, className='col-md-6')],
@@ -166,7 +172,11 @@ def get_layout(app):
             [Div([Graph(id='paths-graph')], className='col-md-8'),
              Div([Mol3dDash(id='structure')], className='col-md-4')], style={'min-height': '400px'},
             className='row col-12')])
-    row_4 = Div([Network(id='net', width=1000, height=1000, data={'nodes': [], 'links': []}),
+    row_4 = Div([Div(['Energy window, kcal/mol: ', Input(id='net_window', type='number', min=0, debounce=True),
+                      ' Reactions from selected complexes: ', Input(id='net_hops', type='number', min=0, step=1,
+                                                                     debounce=True),
+                      Button('Back', id='net_back'), Store(id='net_view')], className='col-12'),
+                 Network(id='net', width=1000, height=1000, data={'nodes': [], 'links': []}),
                  Img(src='', id='net_img', width="30%", height="100%", style={'maxHeight': '200px'}), ],
                 className='row')
 
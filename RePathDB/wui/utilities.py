@@ -17,48 +17,53 @@
 #  You should have received a copy of the GNU Lesser General Public License
 #  along with this program; if not, see <https://www.gnu.org/licenses/>.
 #
-from plotly.graph_objects import Figure, Layout, Scatter
 from CGRdb import db_session, Molecule as cMolecule
-from ..graph import Reaction, Complex, Molecule, Brutto, EquilibriumState, TransitionState
+from ..graph import Reaction, Complex, Molecule, Brutto, EquilibriumState, TransitionState, structure_cache
 from io import StringIO
 from CGRtools import MRVWrite
+from numpy import arange, array
+from .layout import reactant_color, product_color, reaction_color, molecule_color, kcal
 
 
-def get_figure(edges, nodes):
-    edge_trace = Scatter(x=[x for x, _ in edges], y=[x for _, x in edges], line=dict(width=0.5, color='#888'),
-                         hoverinfo='none', mode='lines')
+def profile_coordinates(energies, longest):
+    """
+    Vectorized coordinates of energy profile of path.
 
-    node_trace = Scatter(x=[x[0] for x in nodes.values()], y=[x[1] for x in nodes.values()],
-                         customdata=[(x, y[3]) for x, y in nodes.items()], text=[x[3] for x in nodes.values()],
-                         mode='markers', hoverinfo='text',
-                         marker=dict(showscale=False, color=[x[2] for x in nodes.values()], size=15))
+    :param energies: energies of path nodes. complexes on even and reactions on odd positions.
+        energy of reaction is energy of its transition state
+    :param longest: number of nodes in the longest path. the last complex is placed at the end of the longest path
+    :return: x and y arrays in path order. y in kcal/mol relative to the first complex
+    """
+    y = array(energies, dtype=float)
+    y -= y[0]
+    y *= kcal
+    x = arange(1, len(y) + 1, dtype=float) * 5
+    x[0] = 0
+    x[-1] = longest * 5
+    return x, y
 
-    figure = Figure(data=[edge_trace, node_trace],
-                    layout=Layout(showlegend=False, hovermode='closest', margin=dict(b=20, l=5, r=5, t=40),
-                                  xaxis=dict(showgrid=False, zeroline=False, showticklabels=False),
-                                  yaxis=dict(showgrid=False, zeroline=False, showticklabels=True),
-                                  paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)'), )
-    return figure
 
+def get_profile(path, energies, longest):
+    """
+    Energy profile figure of path.
 
-def get_3d(s, order_map, xyz):
-    bonds = []
-    tmp = {'atoms': [{'elem': a.atomic_symbol, 'x': xyz[n][0], 'y': xyz[n][1], 'z': xyz[n][2]} for n, a in s.atoms()],
-           'bonds': bonds}
-
-    for n, m, b in s.bonds():
-        if b.order is None:
-            bonds.append({'atom1': order_map[n], 'atom2': order_map[m], 'maxorder': b.p_order, 'from': 0})
-        elif b.p_order is None:
-            bonds.append({'atom1': order_map[n], 'atom2': order_map[m], 'maxorder': b.order, 'to': 0})
-        elif b.p_order == b.order:
-            bonds.append({'atom1': order_map[n], 'atom2': order_map[m], 'maxorder': b.order, })
-        else:
-            if b.order > b.p_order:
-                bonds.append({'atom1': order_map[n], 'atom2': order_map[m], 'maxorder': b.order, 'to': b.p_order})
-            else:
-                bonds.append({'atom1': order_map[n], 'atom2': order_map[m], 'maxorder': b.p_order, 'from': b.order})
-    return tmp
+    :param path: ids of path nodes. complexes on even and reactions on odd positions
+    """
+    x, y = profile_coordinates(energies, longest)
+    order = [0, len(path) - 1, *range(1, len(path) - 1)]  # first and last complexes are highlighted by click callback
+    labels = ['Complex ' + str(path[n]) if n % 2 == 0 else 'Reaction' for n in order]
+    colors = [reactant_color, product_color, *(reaction_color if n % 2 else molecule_color for n in order[2:])]
+    edge_trace = {'type': 'scatter', 'x': [*x.tolist(), None], 'y': [*y.tolist(), None],
+                  'line': {'width': 0.5, 'color': '#888'}, 'hoverinfo': 'none', 'mode': 'lines'}
+    node_trace = {'type': 'scatter', 'x': x[order].tolist(), 'y': y[order].tolist(),
+                  'customdata': [(path[n], label) for n, label in zip(order, labels)], 'text': labels,
+                  'mode': 'markers', 'hoverinfo': 'text',
+                  'marker': {'showscale': False, 'color': colors, 'size': 15}}
+    layout = {'showlegend': False, 'hovermode': 'closest', 'margin': {'b': 20, 'l': 5, 'r': 5, 't': 40},
+              'xaxis': {'showgrid': False, 'zeroline': False, 'showticklabels': False},
+              'yaxis': {'showgrid': False, 'zeroline': False, 'showticklabels': True},
+              'paper_bgcolor': 'rgba(0,0,0,0)', 'plot_bgcolor': 'rgba(0,0,0,0)'}
+    return {'data': [edge_trace, node_trace], 'layout': layout}
 
 
 def draw(click_data):
@@ -68,31 +73,13 @@ def draw(click_data):
         return {'atoms': [], 'bonds': []}
     _id, identifier = click_data['points'][0]['customdata']
     with db_session:
-        if identifier == "MOL" or "Complex" in identifier:
-            if identifier == "MOL":
-                # node = Molecule.get(_id)
-                pass
-            if "Complex" in identifier:
-                node = Complex.get(_id)
-            eq = node.equilibrium_states.order_by('energy').first()
-            mp = node.equilibrium_states.relationship(eq).mapping
-            xyz = {mp[k]: v for k, v in eq.xyz.items()}
-            s = node.structure
-            order_map = {n: i for i, n in enumerate(s)}
-            tmp = {'atoms': [{'elem': a.atomic_symbol, 'x': xyz[n][0], 'y': xyz[n][1], 'z': xyz[n][2]} for n, a in
-                             s.atoms()],
-                   'bonds': [{'atom1': order_map[n], 'atom2': order_map[m], 'maxorder': b.order} for n, m, b in
-                             s.bonds()]}
+        if "Complex" in identifier:
+            tmp = Complex.viewer(_id)
+        elif identifier == "MOL":
+            tmp = None
         else:
-            node = Reaction.get(_id)
-            ts = node.transition_states.order_by('energy').first()
-            mp = node.transition_states.relationship(ts).mapping
-            xyz = {mp[k]: v for k, v in ts.xyz.items()}
-            s = node.structure
-            order_map = {n: i for i, n in enumerate(s)}
-            tmp = get_3d(s, order_map, xyz)
-
-    return tmp
+            tmp = Reaction.viewer(_id)
+    return tmp or {'atoms': [], 'bonds': []}
 
 
 def get_mrv(structure):
@@ -118,4 +105,5 @@ def cleanDB():
         i.delete()
     for i in Brutto.nodes.all():
         i.delete()
+    structure_cache.clear()
     return print("cleaned")
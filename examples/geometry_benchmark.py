@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2021 Ramil Nugmanov <nougmanoff@protonmail.com>
+#  Copyright 2021 Timur Gimadiev <timur.gimadiev@gmail.com>
+#  This file is part of RePathDB.
+#
+#  RePathDB is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, see <https://www.gnu.org/licenses/>.
+#
+"""
+Compare size and encoding/decoding time of JSON and binary geometry storage.
+
+    python geometry_benchmark.py -a 50 -n 10000
+"""
+from argparse import ArgumentParser
+from json import dumps, loads
+from random import uniform
+from timeit import timeit
+from RePathDB.geometry import pack_xyz, unpack_xyz
+
+
+parser = ArgumentParser(description='geometry storage benchmark')
+parser.add_argument('--atoms', '-a', type=int, default=50, help='number of atoms')
+parser.add_argument('--number', '-n', type=int, default=10000, help='number of repeats')
+args = parser.parse_args()
+
+xyz = {n: (uniform(-10, 10), uniform(-10, 10), uniform(-10, 10)) for n in range(1, args.atoms + 1)}
+js = dumps(xyz)
+atoms, coords = pack_xyz(xyz)
+
+
+def binary_dict():
+    a, c = unpack_xyz(atoms, coords)
+    return dict(zip(a.tolist(), map(tuple, c.tolist())))
+
+
+tests = (('json write', lambda: dumps(xyz)),
+         ('binary write', lambda: pack_xyz(xyz)),
+         ('json read dict', lambda: {int(k): tuple(v) for k, v in loads(js).items()}),
+         ('binary read arrays', lambda: unpack_xyz(atoms, coords)),
+         ('binary read dict', binary_dict))
+
+print(f'json size: {len(js.encode())} bytes, binary size: {len(atoms) + len(coords)} bytes')
+for name, test in tests:
+    print(f'{name:>20}: {timeit(test, number=args.number) / args.number * 1e6:.2f} us')
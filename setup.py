@@ -37,7 +37,7 @@ setup(
     install_requires=['cgrtools[mrv,clean2djit]',
                       'CGRdb>=4.0.0,<4.2',
                       'neomodel==3.3.2', 'dash==1.15.0', 'dash_marvinjs', 'mol3d_dash', 'plotly==4.9.0', 'dash_network',
-                      'dash_uploader==0.3.1','lxml>=4.1'],
+                      'dash_uploader==0.3.1','lxml>=4.1', 'numpy'],
     long_description=(Path(__file__).parent / 'README.md').read_text(),
     classifiers=['Environment :: Plugins',
                  'Intended Audience :: Science/Research',
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2021 Ramil Nugmanov <nougmanoff@protonmail.com>
+#  Copyright 2021 Timur Gimadiev <timur.gimadiev@gmail.com>
+#  This file is part of RePathDB.
+#
+#  RePathDB is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, see <https://www.gnu.org/licenses/>.
+#
+from itertools import permutations, product
+from math import inf, sqrt
+from numpy import arange, array, diag, sign
+from numpy.linalg import det, svd
+from numpy.random import default_rng
+from RePathDB.dedup import canonical_rmsd, flips, geometry_bucket, near_buckets
+
+
+ranks = array([1, 2, 2, 3, 4, 4, 4])
+groups = [[0], [1, 2], [3], [4, 5, 6]]
+
+
+def kabsch_rmsd(x, y):
+    u, _, vt = svd(x.T @ y)
+    r = u @ diag([1., 1., sign(det(u @ vt))]) @ vt
+    return sqrt(((x @ r - y) ** 2).sum(axis=1).mean())
+
+
+def brute_rmsd(x, y):
+    """
+    The lowest RMSD over all permutations of atoms with equal ranks.
+    """
+    best = inf
+    for perms in product(*(permutations(g) for g in groups)):
+        order = [i for p in perms for i in p]
+        best = min(best, kabsch_rmsd(x[order], y))
+    return best
+
+
+def centered(rng, size=7):
+    x = rng.normal(scale=2., size=(size, 3))
+    return x - x.mean(axis=0)
+
+
+def test_canonical_rmsd_duplicates():
+    rng = default_rng(1)
+    for _ in range(50):
+        x = centered(rng)
+        order = [i for g in groups for i in rng.permutation(g)]
+        for f in flips:  # canonical orientation is defined up to proper flips of axes
+            assert canonical_rmsd(ranks, x, x[order] * f) < 1e-9
+
+
+def test_canonical_rmsd():
+    rng = default_rng(2)
+    for scale in (.001, .01, .1, 1.):
+        for _ in range(50):
+            x = centered(rng)
+            order = [i for g in groups for i in rng.permutation(g)]
+            y = x[order] * flips[rng.integers(4)] + rng.normal(scale=scale, size=x.shape)
+            y -= y.mean(axis=0)
+            expected = brute_rmsd(x, y)
+            found = canonical_rmsd(ranks, x, y)
+            assert found >= expected - 1e-9  # greedy matching of symmetric atoms is never better than optimal
+            if scale <= .01:
+                assert abs(found - expected) < 1e-9
+
+
+def test_canonical_rmsd_shape():
+    rng = default_rng(3)
+    assert canonical_rmsd(arange(7), centered(rng), centered(rng, 6)) == inf
+
+
+def test_near_buckets():
+    rng = default_rng(4)
+    for rmsd in (.01, .05, .2):
+        buckets = set()
+        close = 0
+        for _ in range(200):
+            x = centered(rng)
+            y = x + rng.normal(scale=rmsd / 2, size=x.shape)
+            distance = sqrt(((x - y) ** 2).sum(axis=1).mean())
+            near = near_buckets('CC', x, rmsd)
+            assert geometry_bucket('CC', x) in near
+            if distance <= rmsd:
+                assert geometry_bucket('CC', y) in near
+                close += 1
+            buckets.add(geometry_bucket('CC', x))
+        assert len(buckets) > 1 and close > 100
+    x = centered(rng)
+    assert geometry_bucket('CC', x) != geometry_bucket('CO', x)
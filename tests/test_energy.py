@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2021 Ramil Nugmanov <nougmanoff@protonmail.com>
+#  Copyright 2021 Timur Gimadiev <timur.gimadiev@gmail.com>
+#  This file is part of RePathDB.
+#
+#  RePathDB is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, see <https://www.gnu.org/licenses/>.
+#
+from pytest import approx
+from RePathDB import energy
+from RePathDB.energy import check_energies, checks
+
+
+class FakeDb:
+    """
+    Barriers of C2R and R2C relationships in memory. Barrier computed from missing energy stays missing after repair,
+    as in Neo4j.
+    """
+    def __init__(self, nodes, barriers):
+        self.nodes = nodes  # id: energy
+        self.barriers = barriers  # (complex, reaction): energy
+        self.fixed = []
+
+    def inconsistent(self):
+        # NULL operands are not filtered, thus values which can't be repaired are found on each pass
+        return [[c, r] for (c, r), x in sorted(self.barriers.items()) if x is None or
+                self.nodes[c] is not None and self.nodes[r] is not None and
+                abs(x - self.nodes[r] + self.nodes[c]) > energy.tolerance]
+
+    def cypher_query(self, query, params):
+        find, fix = checks['barriers']
+        if query == f'{find} LIMIT $limit':
+            return [[x] for x in self.inconsistent()[:params['limit']]], None
+        elif query == fix:
+            for c, r in params['rows']:
+                self.fixed.append((c, r))
+                if self.nodes[c] is not None and self.nodes[r] is not None:
+                    self.barriers[(c, r)] = self.nodes[r] - self.nodes[c]
+            return [], None
+        elif query.startswith(find[:find.rindex('RETURN')]):
+            return [[len(self.inconsistent())]], None
+        elif query.endswith('RETURN count(*)'):  # other checks find nothing
+            return [[0]], None
+        return [], None
+
+
+def test_check_energies_repair(monkeypatch):
+    nodes = {1: -1., 2: None, 3: -2., 10: -.5, 11: -.9}
+    barriers = {(1, 10): .1, (2, 10): None, (3, 10): 1.5, (1, 11): None, (3, 11): 1.1, (2, 11): None}
+    db = FakeDb(nodes, barriers)
+    monkeypatch.setattr(energy, 'db', db)
+    assert check_energies()['barriers'] == 4
+
+    report = check_energies(repair=True, batch_size=2)
+    assert report == {'complexes': 0, 'reactions': 0, 'barriers': 4, 'es_ts_barriers': 0}
+    assert sorted(db.fixed) == [(1, 10), (1, 11), (2, 10), (2, 11)]  # each value is repaired once
+    assert barriers[(1, 10)] == approx(.5) and barriers[(1, 11)] == approx(.1)
+    assert barriers[(2, 10)] is barriers[(2, 11)] is None
+
+
+def test_checks_skip_missing_energies():
+    for find, _ in checks.values():
+        assert 'IS NOT NULL AND' in find  # repair of values computed from missing energies never ends
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2021 Ramil Nugmanov <nougmanoff@protonmail.com>
+#  Copyright 2021 Timur Gimadiev <timur.gimadiev@gmail.com>
+#  This file is part of RePathDB.
+#
+#  RePathDB is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, see <https://www.gnu.org/licenses/>.
+#
+from json import dumps, loads
+from random import Random
+from RePathDB.geometry import pack_xyz, same_geometry, signature_hash, unpack_xyz
+
+
+def random_xyz(rnd, size):
+    return {n: (rnd.uniform(-10, 10), rnd.uniform(-10, 10), rnd.uniform(-10, 10))
+            for n in rnd.sample(range(1, 100), size)}
+
+
+def test_pack_xyz():
+    rnd = Random(1)
+    for size in range(1, 30):
+        xyz = random_xyz(rnd, size)
+        atoms, coords = unpack_xyz(*pack_xyz(xyz))
+        assert atoms.tolist() == sorted(xyz)
+        assert coords.shape == (size, 3)
+        assert {n: tuple(x) for n, x in zip(atoms.tolist(), coords.tolist())} == xyz  # lossless
+
+
+def test_pack_xyz_json():
+    """
+    Binary geometry is the same as geometry stored in xyz_json by older versions.
+    """
+    rnd = Random(2)
+    xyz = random_xyz(rnd, 10)
+    stored = {int(k): tuple(v) for k, v in loads(dumps(xyz)).items()}
+    assert pack_xyz(stored) == pack_xyz(xyz)
+
+
+def test_unpack_xyz_no_copy():
+    atoms, coords = pack_xyz({1: (0., 1., 2.), 2: (3., 4., 5.)})
+    _, view = unpack_xyz(atoms, coords)
+    assert not view.flags.owndata
+    assert not view.flags.writeable
+
+
+def test_signature_hash():
+    keys = [dumps(sorted(random_xyz(Random(n), 5).values())) for n in range(100)]
+    hashes = [signature_hash(k) for k in keys]
+    assert all(len(h) == 64 for h in hashes)
+    assert len(set(hashes)) == len(set(keys))
+    assert hashes == [signature_hash(k) for k in keys]
+
+
+def test_same_geometry():
+    rnd = Random(3)
+    xyz = random_xyz(rnd, 8)
+    renumbered = dict(zip(rnd.sample(range(100, 200), 8), xyz.values()))
+    assert same_geometry(xyz, renumbered)
+    assert same_geometry(xyz, {n: tuple(x + 1e-9 for x in v) for n, v in xyz.items()})
+
+    moved = xyz.copy()
+    n = next(iter(moved))
+    moved[n] = (moved[n][0] + .1, *moved[n][1:])
+    assert not same_geometry(xyz, moved)
+    del moved[n]
+    assert not same_geometry(xyz, moved)
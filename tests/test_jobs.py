@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2021 Ramil Nugmanov <nougmanoff@protonmail.com>
+#  Copyright 2021 Timur Gimadiev <timur.gimadiev@gmail.com>
+#  This file is part of RePathDB.
+#
+#  RePathDB is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, see <https://www.gnu.org/licenses/>.
+#
+from bz2 import compress as bz2_compress
+from gzip import compress as gzip_compress
+from io import BytesIO
+from lzma import compress as xz_compress
+from tarfile import TarInfo, open as tar_open
+from zipfile import ZipFile
+from RePathDB.jobs import Job, iter_members
+
+
+data = b'Update the reaction path\n'
+
+
+def test_iter_members(tmp_path):
+    plain = tmp_path / 'a.log'
+    plain.write_bytes(data)
+    assert list(iter_members(plain, '.log')) == [('a.log', data)]
+
+    archive = tmp_path / 'b.zip'
+    with ZipFile(str(archive), 'w') as f:
+        f.writestr('x/c.log', data)
+        f.writestr('x/c.txt', data)
+        f.writestr('__MACOSX/x/._c.log', data)
+    assert list(iter_members(archive, '.log')) == [('b.zip/x/c.log', data)]
+
+    archive = tmp_path / 'd.tar.gz'
+    with tar_open(str(archive), 'w:gz') as f:
+        for name in ('e.log', 'e.txt'):
+            info = TarInfo(name)
+            info.size = len(data)
+            f.addfile(info, BytesIO(data))
+    assert list(iter_members(archive, '.log')) == [('d.tar.gz/e.log', data)]
+
+
+def test_iter_members_compressed(tmp_path):
+    for extension, compress in (('.gz', gzip_compress), ('.bz2', bz2_compress), ('.xz', xz_compress)):
+        file = tmp_path / f'a.log{extension}'
+        file.write_bytes(compress(data))
+        assert list(iter_members(file, '.log')) == [(file.name, data)]
+        assert list(iter_members(file, '.out')) == [(file.name, None)]  # compressed file of other type
+
+        broken = tmp_path / f'b.log{extension}'
+        broken.write_bytes(data)
+        assert list(iter_members(broken, '.log')) == [(broken.name, None)]
+
+
+def test_job_unsupported_files(tmp_path):
+    file = tmp_path / 'a.txt'
+    file.write_bytes(data)
+    job = Job([file], '.log')
+    assert list(job._parse(None)) == [('a.txt', None)]  # written by bulk loader as invalid file
+    assert job.report['total'] == 1
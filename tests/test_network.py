@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2021 Ramil Nugmanov <nougmanoff@protonmail.com>
+#  Copyright 2021 Timur Gimadiev <timur.gimadiev@gmail.com>
+#  This file is part of RePathDB.
+#
+#  RePathDB is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, see <https://www.gnu.org/licenses/>.
+#
+from random import Random
+from RePathDB import network
+from RePathDB.network import coarsen_summary, label_propagation, network_view
+
+
+def random_summary(seed, complexes=30, reactions=40):
+    """
+    Network overview of the same format as `BruttoNetwork.summary`.
+    """
+    rnd = Random(seed)
+    nodes = {c: [c, -rnd.random(), 0, 1] for c in range(1, complexes + 1)}
+    links = {}
+    for r in range(1000, 1000 + reactions):
+        c, p = rnd.sample(list(nodes), 2)
+        if (c, p) not in links:
+            links[(c, p)] = [c, p, r, rnd.random(), 1]
+            nodes[c][2] += 1
+            nodes[p][2] += 1
+    return {'nodes': list(nodes.values()), 'links': list(links.values())}
+
+
+def components(summary):
+    """
+    Brute-force connected components of undirected network.
+    """
+    labels = {n[0]: n[0] for n in summary['nodes']}
+    changed = True
+    while changed:
+        changed = False
+        for c, p, *_ in summary['links']:
+            x = min(labels[c], labels[p])
+            if labels[c] != x or labels[p] != x:
+                labels[c] = labels[p] = x
+                changed = True
+    return labels
+
+
+def test_coarsen_summary():
+    for seed in range(100):
+        summary = random_summary(seed)
+        rnd = Random(seed)
+        keep = rnd.sample([n[0] for n in summary['nodes']], rnd.randint(0, 3))
+        for max_nodes in (1, 5, 10):
+            coarse = coarsen_summary(summary, max_nodes, keep)
+            ids = {n[0] for n in coarse['nodes']}
+            assert len(ids) <= max(max_nodes, len(keep))
+            assert ids.issuperset(keep)
+
+            # all complexes of components with hubs are merged. other complexes are hidden
+            labels = components(summary)
+            visible = {labels[x] for x in ids}
+            assert coarse['hidden'] == sum(labels[n[0]] not in visible for n in summary['nodes'])
+            assert sum(n[3] for n in coarse['nodes']) + coarse['hidden'] == len(summary['nodes'])
+
+            energies = {n[0]: n[1] for n in summary['nodes']}
+            for n in coarse['nodes']:
+                assert n[1] <= energies[n[0]]
+                assert n[2] == sum(n[0] in x[:2] for x in coarse['links'])
+            assert all(x[0] in ids and x[1] in ids and x[0] != x[1] for x in coarse['links'])
+
+
+def test_coarsen_summary_nearest_hub():
+    # two stars with centers 1 and 2 connected by chain 1-10-11-12-2
+    links = [[1, x, x, 0., 1] for x in (3, 4, 5)] + [[2, x, x, 0., 1] for x in (6, 7)] + \
+        [[1, 10, 20, 0., 1], [10, 11, 21, 0., 1], [11, 12, 22, 0., 1], [12, 2, 23, 0., 1]]
+    degrees = {}
+    for c, p, *_ in links:
+        degrees[c] = degrees.get(c, 0) + 1
+        degrees[p] = degrees.get(p, 0) + 1
+    summary = {'nodes': [[c, float(c), d, 1] for c, d in degrees.items()] + [[99, -1., 0, 1]], 'links': links}
+    coarse = coarsen_summary(summary, 2)
+    # 11 is at the same distance from both hubs and goes to the hub with smaller id
+    assert sorted(coarse['nodes']) == [[1, 1., 1, 6], [2, 2., 1, 4]]
+    assert coarse['links'] == [[1, 2, 22, 0., 1]]
+    assert coarse['hidden'] == 1
+
+
+def test_label_propagation():
+    for seed in range(100):
+        summary = random_summary(seed)
+        components_ = components(summary)
+        labels = label_propagation(summary)
+        assert set(labels) == set(components_)
+        assert all(components_[labels[c]] == components_[c] for c in labels)  # communities never cross components
+
+        # result doesn't depend on order of links
+        shuffled = {'nodes': summary['nodes'][::-1], 'links': summary['links'][:]}
+        Random(seed).shuffle(shuffled['links'])
+        assert label_propagation(shuffled) == labels
+
+
+def test_label_propagation_cliques():
+    # cliques 1-5 and 6-10 connected by 5-6 link. 11 is isolated
+    links = [[c, p, 100 * c + p, 0., 1] for k in (0, 5) for c in range(k + 1, k + 6) for p in range(c + 1, k + 6)]
+    links.append([5, 6, 56, 0., 1])
+    summary = {'nodes': [[c, 0., 0, 1] for c in range(1, 12)], 'links': links}
+    labels = label_propagation(summary)
+    assert len({labels[c] for c in range(1, 6)}) == len({labels[c] for c in range(6, 11)}) == 1
+    assert labels[1] != labels[6]
+    assert labels[11] == 11
+
+
+def neighborhood(summary, centers, hops):
+    """
+    Brute-force complexes in given number of reactions from centers.
+    """
+    distance = {n[0]: 0 if n[0] in centers else hops + 1 for n in summary['nodes']}
+    for _ in range(hops):
+        for c, p, *_ in summary['links']:
+            distance[c] = min(distance[c], distance[p] + 1)
+            distance[p] = min(distance[p], distance[c] + 1)
+    return {c for c, d in distance.items() if d <= hops}
+
+
+def test_network_view(monkeypatch):
+    for seed in range(100):
+        summary = random_summary(seed)
+        monkeypatch.setattr(network, 'network_summary', lambda brutto: summary)
+        assert network_view(1, 1000) == summary
+
+        rnd = Random(seed)
+        focus = rnd.sample([n[0] for n in summary['nodes']], rnd.randint(1, 2))
+        window = rnd.random()
+        hops = rnd.randint(1, 3)
+        energies = {n[0]: n[1] for n in summary['nodes']}
+        threshold = min(energies[x] for x in focus) + window
+        expected = {'nodes': [n for n in summary['nodes'] if n[1] <= threshold or n[0] in focus]}
+        ids = {n[0] for n in expected['nodes']}
+        expected['links'] = [x for x in summary['links'] if x[0] in ids and x[1] in ids and x[3] <= threshold]
+
+        view = network_view(1, 1000, focus, window=window)
+        assert view == expected
+        view = network_view(1, 1000, focus, hops=hops, window=window)
+        assert {n[0] for n in view['nodes']} == neighborhood(expected, focus, hops)
+
+
+def test_network_view_bounded(monkeypatch):
+    for seed in range(100):
+        summary = random_summary(seed, complexes=60, reactions=80)
+        monkeypatch.setattr(network, 'network_summary', lambda brutto: summary)
+        rnd = Random(seed)
+        focus = rnd.sample([n[0] for n in summary['nodes']], rnd.randint(0, 2))
+        for max_nodes in (3, 10, 20):
+            view = network_view(1, max_nodes, focus)
+            ids = {n[0] for n in view['nodes']}
+            assert len(ids) <= max(max_nodes, len(focus))
+            assert ids.issuperset(focus)
+            assert sum(n[3] for n in view['nodes']) + view.get('hidden', 0) == len(summary['nodes'])
+
+        # drill-down into community shows its members
+        labels = label_propagation(summary)
+        view = network_view(1, 20)
+        for community in (n[0] for n in view['nodes'] if n[0] < 0):
+            members = {c for c, x in labels.items() if -x - 1 == community}
+            expanded = network_view(1, 1000, communities=[community])
+            assert {n[0] for n in expanded['nodes']} == members
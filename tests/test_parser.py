@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2021 Ramil Nugmanov <nougmanoff@protonmail.com>
+#  Copyright 2021 Timur Gimadiev <timur.gimadiev@gmail.com>
+#  This file is part of RePathDB.
+#
+#  RePathDB is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, see <https://www.gnu.org/licenses/>.
+#
+from io import StringIO
+from pytest import raises
+from random import Random
+from RePathDB.parser import log_parser, profile_parser
+
+
+def path_log(energies, seed=0):
+    rnd = Random(seed)
+    lines = ['Update the reaction path\n']
+    for n, e in enumerate(energies):
+        lines.append(f'# NODE {n}\n')
+        lines.append('Item 1\n')
+        lines.append('H   0.000000000000   0.000000000000   0.000000000000\n')
+        lines.append(f'H   0.{rnd.randint(700, 800)}000000000   0.000000000000   0.000000000000\n')
+        lines.append(f'ENERGY   {e:.8f}   0.000000000000   0.000000000000\n')
+        lines.append('\n')
+    return ''.join(lines)
+
+
+def baseline(energies):
+    """
+    Points chosen by the original parser keeping all points in memory: the first and the last points are ES,
+    the first of the highest energy points is TS.
+    """
+    pts = [{'energy': e, 'type': 'TMP', 'n': n} for n, e in enumerate(energies)]
+    pts[0]['type'] = pts[-1]['type'] = 'EQ'
+    if len(pts) < 3:
+        raise ValueError
+    ts = sorted(pts, key=lambda x: x['energy'], reverse=True)[0]
+    if ts['type'] == 'EQ':
+        raise ValueError
+    return pts[0]['energy'], pts[-1]['energy'], ts['energy']
+
+
+def test_pt_parser():
+    rnd = Random(1)
+    for seed in range(300):
+        energies = [-float(rnd.randint(0, 5)) for _ in range(rnd.randint(1, 8))]
+        try:
+            expected = baseline(energies)
+        except ValueError:
+            with raises(ValueError):
+                log_parser(StringIO(path_log(energies, seed)))
+            continue
+        a, b = log_parser(StringIO(path_log(energies, seed)))
+        (r,), (p,), (ts,) = a.reactants, a.products, a.reagents
+        assert (r.meta['energy'], p.meta['energy'], ts.meta['energy']) == expected
+        assert (r.meta['type'], p.meta['type'], ts.meta['type']) == ('EQ', 'EQ', 'TS')
+        assert b.reactants == a.products and b.products == a.reactants and b.reagents == a.reagents
+
+
+def test_profile_parser():
+    energies = [-1., -.5, -.7, -1.2]
+    points = list(profile_parser(StringIO(path_log(energies))))
+    assert [x.meta['energy'] for x in points] == energies
+    assert all(x.meta['type'] == 'TMP' for x in points)
+    with raises(ValueError):
+        profile_parser(StringIO('other\n'))
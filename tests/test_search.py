@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2021 Ramil Nugmanov <nougmanoff@protonmail.com>
+#  Copyright 2021 Timur Gimadiev <timur.gimadiev@gmail.com>
+#  This file is part of RePathDB.
+#
+#  RePathDB is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, see <https://www.gnu.org/licenses/>.
+#
+from pytest import mark
+from random import Random
+from RePathDB.search import (bidirectional_paths, bottleneck_paths, breadth_first_paths, k_shortest_paths,
+                             max_steps)
+
+
+class Network:
+    """
+    Random reaction network with integer barriers.
+    """
+    def __init__(self, seed, complexes=8, reactions=16):
+        rnd = Random(seed)
+        self.edges = {c: [] for c in range(complexes)}
+        for r in range(100, 100 + reactions):
+            c, p = rnd.sample(range(complexes), 2)
+            self.edges[c].append((r, float(rnd.randint(0, 9)), p))
+        self.sources = rnd.sample(range(complexes), rnd.randint(1, 2))
+        self.targets = rnd.sample(range(complexes), rnd.randint(1, 2))
+
+    def successors(self, complex_):
+        return self.edges[complex_]
+
+    def predecessors(self, complex_):
+        return [(r, b, c) for c, edges in self.edges.items() for r, b, p in edges if p == complex_]
+
+
+def all_paths(network, max_len):
+    """
+    Brute-force enumeration of loopless paths from sources to the first reached target.
+    """
+    banned = set(network.sources)
+    sources = banned - set(network.targets)
+    targets = set(network.targets) - banned
+    limit = max_steps(max_len)
+    paths = []
+
+    def walk(path):
+        if path[-1][0] in targets:
+            paths.append(path)
+            return
+        if len(path) // 2 == limit:
+            return
+        visited = {x for x, _ in path[::2]}
+        for r, b, p in network.successors(path[-1][0]):
+            if p not in banned and p not in visited:
+                walk(path + [(r, b), (p, b)])
+
+    for s in sorted(sources):
+        walk([(s, 0)])
+    return paths
+
+
+def path_cost(path, cost):
+    barriers = [b for _, b in path[1::2]]
+    return sum(barriers) if cost == 'total' else max(barriers)
+
+
+@mark.parametrize('cost', ['total', 'barrier'])
+@mark.parametrize('max_len', [3, 6, 10])
+def test_k_shortest_paths(cost, max_len):
+    for seed in range(200):
+        network = Network(seed)
+        expected = all_paths(network, max_len)
+        keys = {tuple(x for x, _ in p) for p in expected}
+        found = list(k_shortest_paths(network, network.sources, network.targets, 5, max_len, cost))
+
+        assert [c for c, _ in found] == sorted(path_cost(p, cost) for p in expected)[:5], seed
+        assert len({tuple(x for x, _ in p) for _, p in found}) == len(found)
+        for c, p in found:
+            assert tuple(x for x, _ in p) in keys
+            assert c == path_cost(p, cost)
+
+
+def test_k_shortest_paths_all():
+    for seed in range(100):
+        network = Network(seed, 6, 12)
+        expected = all_paths(network, 10)
+        found = list(k_shortest_paths(network, network.sources, network.targets, 1000, 10))
+        assert sorted(tuple(x for x, _ in p) for _, p in found) == sorted(tuple(x for x, _ in p) for p in expected)
+
+
+@mark.parametrize('max_len', [3, 6, 10])
+def test_bottleneck_paths(max_len):
+    for seed in range(200):
+        network = Network(seed)
+        expected = all_paths(network, max_len)
+        keys = {tuple(x for x, _ in p) for p in expected}
+        found = list(bottleneck_paths(network, network.sources, network.targets, 5, max_len))
+
+        assert [c for c, _ in found] == sorted(path_cost(p, 'barrier') for p in expected)[:5], seed
+        assert len({tuple(x for x, _ in p) for _, p in found}) == len(found)
+        for c, p in found:
+            assert tuple(x for x, _ in p) in keys
+            assert c == path_cost(p, 'barrier')
+
+
+def shortest_paths(network, max_len):
+    """
+    Brute-force paths of breadth-first search: each intermediate complex is at its shortest distance from sources.
+    """
+    banned = set(network.sources)
+    targets = set(network.targets) - banned
+    distance = dict.fromkeys(banned - set(network.targets), 0)
+    level = list(distance)
+    depth = 0
+    while level:
+        depth += 1
+        level = {p for c in level for _, _, p in network.successors(c)
+                 if p not in distance and p not in banned and p not in targets}
+        distance.update(dict.fromkeys(level, depth))
+    return [p for p in all_paths(network, max_len) if all(distance[x] == i for i, (x, _) in enumerate(p[:-1:2]))]
+
+
+class CountingNetwork(Network):
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.calls = 0
+
+    def successors(self, complex_):
+        self.calls += 1
+        return super().successors(complex_)
+
+
+@mark.parametrize('max_len', [1, 3, 6, 10])
+def test_breadth_first_paths(max_len):
+    for seed in range(300):
+        network = Network(seed)
+        found = [tuple(x for x, _ in p) for p in breadth_first_paths(network, network.sources, network.targets,
+                                                                      max_len)]
+        expected = [tuple(x for x, _ in p) for p in shortest_paths(network, max_len)]
+        assert sorted(found) == sorted(expected), seed
+        assert [len(x) for x in found] == sorted(len(x) for x in found)
+
+
+@mark.parametrize('max_len', [1, 3, 6, 10])
+def test_bidirectional_paths(max_len):
+    for seed in range(300):
+        for size in ((8, 16), (20, 30)):
+            network = CountingNetwork(seed, *size)
+            expected = list(breadth_first_paths(network, network.sources, network.targets, max_len))
+            calls = network.calls
+            network.calls = 0
+            assert list(bidirectional_paths(network, network.sources, network.targets, max_len)) == expected, seed
+            assert network.calls <= calls
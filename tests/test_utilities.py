@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+#
+#  Copyright 2021 Ramil Nugmanov <nougmanoff@protonmail.com>
+#  Copyright 2021 Timur Gimadiev <timur.gimadiev@gmail.com>
+#  This file is part of RePathDB.
+#
+#  RePathDB is free software; you can redistribute it and/or modify
+#  it under the terms of the GNU Lesser General Public License as published by
+#  the Free Software Foundation; either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU Lesser General Public License for more details.
+#
+#  You should have received a copy of the GNU Lesser General Public License
+#  along with this program; if not, see <https://www.gnu.org/licenses/>.
+#
+from collections import namedtuple
+from pytest import approx
+from RePathDB.wui.layout import reactant_color, product_color, reaction_color, molecule_color
+from RePathDB.wui.utilities import get_profile
+
+
+Node = namedtuple('Node', ['id', 'energy'])
+
+
+def baseline(nodes, longest):
+    """
+    Edges and nodes of profile figure built by the original callback with get_figure.
+    Transition states are placed at energy of reaction.
+    """
+    zero_en = nodes[0].energy
+    figure = {nodes[0].id: (0, 0, reactant_color, 'Complex ' + str(nodes[0].id)),
+              nodes[-1].id: (longest * 5, (nodes[-1].energy - zero_en) * 627.51, product_color,
+                             'Complex ' + str(nodes[-1].id))}
+    for n, x in enumerate(nodes, start=1):
+        if x.id not in figure:
+            figure[x.id] = (n * 5, (x.energy - zero_en) * 627.51, molecule_color if n % 2 else reaction_color,
+                            'Complex ' + str(x.id) if n % 2 else 'Reaction')
+    edges = [figure[x.id][:2] for x in nodes]
+    edges.append((None, None))
+    return edges, figure
+
+
+def test_get_profile():
+    nodes = [Node(1, -1.), Node(101, -.95), Node(2, -1.01), Node(102, -.97), Node(3, -1.02), Node(103, -.98),
+             Node(4, -1.03)]
+    longest = 9
+    edges, expected = baseline(nodes, longest)
+    figure = get_profile([x.id for x in nodes], [x.energy for x in nodes], longest)
+    edge_trace, node_trace = figure['data']
+
+    assert edge_trace['x'][-1] is edge_trace['y'][-1] is None
+    assert list(zip(edge_trace['x'][:-1], edge_trace['y'][:-1])) == approx(edges[:-1])
+
+    found = {n: (x, y, color, label) for (n, label), x, y, color in
+             zip(node_trace['customdata'], node_trace['x'], node_trace['y'], node_trace['marker']['color'])}
+    assert list(found) == list(expected)  # first and last complexes go first
+    for n, (x, y, color, label) in expected.items():
+        assert found[n] == (approx(x), approx(y), color, label)
+    assert found[101][1] == approx(.05 * 627.51)  # transition state isn't shifted by barrier